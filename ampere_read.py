@@ -19,21 +19,489 @@ import numpy as np # Numerical Python
 import matplotlib.pyplot as plt # Mathematical Plotting Library
 import netCDF4 as ncdf # Library to read in netCDF files
 import datetime as dt # Library to work with dates and times
+import os # Operating system interfaces
+import json # Cache metadata
+import shutil # Removing stale cache entries
+import hashlib # Cache entry names
+import re # Parsing AMPERE filenames
 import matplotlib.colors as colors # Module required to use Normalize function
 
 
+def _grid(flat, nLat, nMLT):
+    """
+    Reshape gridded AMPERE records into (..., nLat, nMLT) matrices. Records are
+    stored MLT-major, i.e. the 1D index of cell (i, j) is i + j * nLat. Any
+    leading (time) axes are kept. Masked (missing) cells are returned as NaN,
+    so they are not mistaken for zero current.
+    """
+
+    flat = np.ma.filled(np.ma.asarray(flat, dtype=float), np.nan)
+    return flat.reshape(flat.shape[:-1] + (nMLT, nLat)).swapaxes(-1, -2)
+
+
+def _ghost(grid, offset=0.):
+    """
+    Append the ghost cell column to a (..., nLat, nMLT) matrix. The ghost
+    column repeats the first MLT column, shifted by offset.
+    """
+
+    return np.concatenate((grid, grid[..., :1] + offset), axis=-1)
+
+
+def _decode_time(yr, mo, dy, hr, mt):
+    """
+    Decode the start_yr .. start_mt record variables into a datetime64[s]
+    array.
+    """
+
+    yr, mo, dy, hr, mt = [np.asarray(x, dtype='i8')
+                          for x in (yr, mo, dy, hr, mt)]
+    month = ((yr - 1970) * 12 + mo - 1).astype('M8[M]')
+    return (month.astype('M8[D]') + (dy - 1).astype('m8[D]') +
+            hr.astype('m8[h]') + mt.astype('m8[m]')).astype('M8[s]')
+
+
+def _seconds(t_date):
+    """
+    Convert a datetime or datetime64 into integer seconds since the epoch.
+    """
+
+    return int(np.datetime64(t_date, 's').astype('i8'))
+
+
+def _tolerance(tolerance):
+    """
+    Convert a tolerance (timedelta or seconds) into seconds.
+    """
+
+    if isinstance(tolerance, dt.timedelta):
+        return tolerance.total_seconds()
+    return float(tolerance)
+
+
+# AMPERE filenames: YYYYMMDD.HHMM.<duration s>.<cadence s>.<hemi>.grd.ncdf
+_FNAME = re.compile(r'(\d{8})\.(\d{4})\.(\d+)\.(\d+)\.(north|south)'
+                    r'\.grd\.ncdf$')
+
+
+def parse_fname(fname):
+    """
+    Parse an AMPERE filename into its start time, duration, cadence and
+    hemisphere. Returns None if the filename does not follow the AMPERE
+    naming convention.
+    """
+
+    match = _FNAME.search(os.path.basename(fname))
+    if match is None:
+        return None
+    return {'start': dt.datetime.strptime(match.group(1) + match.group(2),
+                                          '%Y%m%d%H%M'),
+            'duration': dt.timedelta(seconds=int(match.group(3))),
+            'cadence': dt.timedelta(seconds=int(match.group(4))),
+            'hemi': match.group(5)}
+
+
+def _hemisphere(fname):
+    """
+    Identify if a file holds data of the Northern or Southern Hemisphere.
+    """
+
+    fchar = []; fchar[:] = fname.split("/")[-1]
+    if (fchar[-14:-9] == ['n', 'o', 'r', 't', 'h']):
+        return 'north'
+    return 'south'
+
+
+class NoRecordError(ValueError):
+    """
+    No AMPERE data for a requested time: no file covers it, or the file has
+    no record at (or near enough to) it.
+    """
+
+
+def _plottable(Lat, MLT, J_r, hemi):
+    """
+    Convert MLT, Latitude and Jr data into directly plottable values.
+    """
+
+    if hemi == 'north':
+        MLT_plot = MLT * np.pi/12. - np.pi/2.
+        Lat_plot = 90. - Lat
+        J_r_plot = J_r
+    else:
+        MLT_plot = MLT * np.pi/12. - np.pi/2.
+        Lat_plot = 90. + Lat
+        J_r_plot = J_r
+
+    ampere_data = {}
+    ampere_data['MLT'] = MLT_plot
+    ampere_data['Lat'] = Lat_plot
+    ampere_data['Jr'] = J_r_plot
+
+    return ampere_data
+
+
+class AmpereFile(object):
+    """
+    Whole-file reader for a single-hemisphere AMPERE netCDF file.
+
+    The dataset is opened once and kept open until close() is called (or the
+    with-block ends). The Latitude, MLT and Jr grids of every record are read
+    as (time, lat, mlt) cubes, ghost cell included, the first time they are
+    needed (or when iterating over the file); single frames requested before
+    that are read record by record.
+
+    Frames are accessed by record index or by datetime:
+
+        >>> with AmpereFile(northfile) as amp:
+        ...     frame = amp[dt.datetime(2011, 9, 27, 0, 0, 0)]
+        ...     block = amp[dt.datetime(2011, 9, 27, 0, 0, 0):
+        ...                 dt.datetime(2011, 9, 27, 1, 0, 0)]
+        ...     for frame in amp:
+        ...         pass
+
+    Integer and datetime keys return the same plottable dictionary as
+    ampere_read. Slices return the same keys holding (time, lat, mlt) arrays
+    plus a 'time' array (datetime64). Datetime slices include both end points,
+    like the time loop in fac_compare, and need not fall on the record grid.
+
+    The time axis is decoded once into a datetime64 array (AmpereFile.time)
+    with a lookup table from time to record, so exact lookups are constant
+    time. nearest() and bracket() serve arbitrary times, e.g. at SWMF
+    cadence; tolerance (timedelta or seconds) makes off-grid times resolve
+    to the nearest record instead of raising ValueError.
+
+    With cache_dir, the decoded time axis and cubes are kept on disk as .npy
+    files, one entry per source path. The entry records the size and
+    modification time of the source and is rewritten when the source changes.
+    On a cache hit the cubes are memory-mapped and the netCDF file is not
+    opened at all. The cache is opt-in; the first (cold) read decodes the
+    whole file.
+
+    The hemisphere ('north' or 'south') is taken from the filename unless
+    given as hemi.
+    """
+
+    def __init__(self, fname, tolerance=None, cache_dir=None, hemi=None,
+                 debug=False):
+        self.fname = fname
+        self.hemi = hemi if hemi is not None else _hemisphere(fname)
+        self.tolerance = tolerance
+        self.data = None
+
+        self._cubes = {} # (time, lat, mlt) cubes, filled on first use
+
+        # Warm start: memory-map the decoded cubes instead of reading netCDF
+        if cache_dir is not None and self._load_cache(cache_dir):
+            if debug: print('Cache hit: ' + self._cache_path(cache_dir))
+            return
+
+        # Retrieve data for given Hemisphere!!!
+        self.data = ncdf.Dataset(fname)
+
+        # Set Size of Matrices
+        self.nLat = int(self.data.variables['nlat'][0]) # Number of Latitudes
+        self.nMLT = int(self.data.variables['nlon'][0]) # Number of MLTs
+        self.nTime = len(self.data.variables['start_yr']) # Number of Records
+
+        if debug: print(self.hemi, self.nLat, self.nMLT, self.nTime)
+
+        # Time Array, decoded once; plus a lookup table from time to record
+        self.time = _decode_time(*[self.data.variables[key][:]
+                                   for key in ('start_yr', 'start_mo',
+                                               'start_dy', 'start_hr',
+                                               'start_mt')])
+        self._index_time()
+
+        if cache_dir is not None:
+            self._write_cache(cache_dir)
+
+    def _index_time(self):
+        """
+        Build the lookup table from time to record.
+        """
+
+        self.nTime = len(self.time)
+        self._records = dict(zip(self.time.astype('i8').tolist(),
+                                 range(self.nTime)))
+
+    # ------------------------------------------------------------------------
+    # On-disk cache of the decoded cubes
+
+    def _cache_path(self, cache_dir):
+        """
+        Cache entry directory of this file; one entry per source path.
+        """
+
+        path = os.path.abspath(self.fname)
+        key = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(cache_dir, os.path.basename(path) + '.' + key)
+
+    def _source_stamp(self):
+        """
+        Path, size and modification time of the source file.
+        """
+
+        stat = os.stat(self.fname)
+        return {'path': os.path.abspath(self.fname), 'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns}
+
+    def _load_cache(self, cache_dir):
+        """
+        Memory-map the cached cubes if the cache entry matches the source
+        file. Returns False (cache miss) otherwise.
+        """
+
+        entry = self._cache_path(cache_dir)
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if meta.get('source') != self._source_stamp():
+            return False
+
+        # Another process may replace a stale entry meanwhile: a miss
+        try:
+            time = np.load(os.path.join(entry, 'time.npy'))
+            cubes = {name: np.load(os.path.join(entry, name + '.npy'),
+                                   mmap_mode='r')
+                     for name in ('Lat', 'MLT', 'Jr')}
+        except (OSError, ValueError):
+            return False
+
+        self.nLat, self.nMLT = meta['nLat'], meta['nMLT']
+        self.time = time
+        self._cubes.update(cubes)
+        self._index_time()
+        return True
+
+    def _entry_current(self, entry):
+        """
+        Whether a cache entry is complete and matches the source file.
+        """
+
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                return json.load(f).get('source') == self._source_stamp()
+        except (OSError, ValueError):
+            return False
+
+    def _write_cache(self, cache_dir):
+        """
+        Decode all cubes and write them, with the time axis, to a new cache
+        entry. The entry is written aside and moved into place, so a reader
+        never sees a partial entry. The metadata is written last.
+
+        Several processes may miss the cache at once and race to write the
+        same entry: when another writer got there first, its entry is kept
+        and this one is dropped. The aside copy is always removed.
+        """
+
+        entry = self._cache_path(cache_dir)
+        tmp = '{0}.tmp{1}'.format(entry, os.getpid())
+        try:
+            os.makedirs(tmp, exist_ok=True)
+            np.save(os.path.join(tmp, 'time.npy'), self.time)
+            for name in ('Lat', 'MLT', 'Jr'):
+                np.save(os.path.join(tmp, name + '.npy'), self.cube(name))
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump({'source': self._source_stamp(), 'nLat': self.nLat,
+                           'nMLT': self.nMLT}, f)
+
+            for attempt in range(2):
+                try:
+                    os.rename(tmp, entry)
+                    return
+                except OSError:
+                    # Entry in the way: written by another process, or stale
+                    if self._entry_current(entry):
+                        return
+                    shutil.rmtree(entry, ignore_errors=True)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.nTime
+
+    def __iter__(self):
+        for name in ('Lat', 'MLT', 'Jr'):
+            self.cube(name) # One read per variable for the whole file
+        for t_ind in range(self.nTime):
+            yield self[t_ind]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            ampere_data = _plottable(*self.grids(self._slice(key)),
+                                     self.hemi)
+            ampere_data['time'] = self.time[self._slice(key)]
+            return ampere_data
+
+        return _plottable(*self.grids(self.index(key)), self.hemi)
+
+    def close(self):
+        """
+        Close the underlying netCDF dataset, if it was opened.
+        """
+
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def index(self, t_date, tolerance=None):
+        """
+        Return the record index of a time. Integers pass through; datetimes
+        (or numpy datetime64) are looked up in constant time. A time that is
+        not on the record grid raises ValueError, unless a tolerance
+        (timedelta or seconds) is given, in which case the nearest record
+        within the tolerance is returned. The file-wide tolerance passed to
+        AmpereFile is used by default.
+        """
+
+        if isinstance(t_date, (int, np.integer)):
+            return int(t_date)
+
+        t_ind = self._records.get(_seconds(t_date))
+        if t_ind is not None:
+            return t_ind
+
+        if tolerance is None: tolerance = self.tolerance
+        if tolerance is None:
+            raise NoRecordError('{0} is not a record time of {1}'
+                                .format(t_date, self.fname))
+        return self.nearest(t_date, tolerance)
+
+    def nearest(self, t_date, tolerance=None):
+        """
+        Return the index of the record nearest in time to t_date. If a
+        tolerance (timedelta or seconds) is given and the nearest record is
+        further away than that, ValueError is raised.
+        """
+
+        sec = _seconds(t_date)
+        t_sec = self.time.astype('i8')
+        i = int(np.searchsorted(t_sec, sec))
+        candidates = [j for j in (i - 1, i) if 0 <= j < self.nTime]
+        t_ind = min(candidates, key=lambda j: abs(t_sec[j] - sec))
+
+        if (tolerance is not None and
+                abs(t_sec[t_ind] - sec) > _tolerance(tolerance)):
+            raise NoRecordError('No record of {0} within {1} of {2}'
+                                .format(self.fname, tolerance, t_date))
+        return t_ind
+
+    def bracket(self, t_date, tolerance=None):
+        """
+        Return the indices of the records just before and just after t_date,
+        and the weight of the later record for linear interpolation in time
+        (0 when t_date falls on the earlier record). A time on the record
+        grid returns the same index twice. ValueError is raised if t_date is
+        outside the file, or if a tolerance (timedelta or seconds) is given
+        and the two records are further apart than that (a data gap).
+        """
+
+        sec = _seconds(t_date)
+        t_sec = self.time.astype('i8')
+        if sec < t_sec[0] or sec > t_sec[-1]:
+            raise NoRecordError('{0} is outside of {1}'
+                                .format(t_date, self.fname))
+
+        t_ind = self._records.get(sec)
+        if t_ind is not None:
+            return t_ind, t_ind, 0.
+
+        i1 = int(np.searchsorted(t_sec, sec))
+        i0 = i1 - 1
+        gap = t_sec[i1] - t_sec[i0]
+        if tolerance is not None and gap > _tolerance(tolerance):
+            raise ValueError('Records of {0} around {1} are {2} s apart'
+                             .format(self.fname, t_date, gap))
+        return i0, i1, float((sec - t_sec[i0]) / gap)
+
+    def _slice(self, key):
+        """
+        Convert a slice by datetime into a slice by record index. Datetime
+        end points do not have to fall on the record grid.
+        """
+
+        start, stop = key.start, key.stop
+        if start is not None and not isinstance(start, (int, np.integer)):
+            start = int(np.searchsorted(self.time.astype('i8'),
+                                        _seconds(start), 'left'))
+        if stop is not None and not isinstance(stop, (int, np.integer)):
+            stop = int(np.searchsorted(self.time.astype('i8'),
+                                       _seconds(stop), 'right'))
+        return slice(start, stop, key.step)
+
+    def cube(self, name):
+        """
+        Return the (time, lat, mlt) cube of 'Lat', 'MLT' or 'Jr', ghost cell
+        included. The cube is read from file the first time it is requested.
+        """
+
+        if name not in self._cubes:
+            self._cubes[name] = self._read(name, slice(None))
+        return self._cubes[name]
+
+    @property
+    def jr(self):
+        """
+        (time, lat, mlt) cube of the radial current density.
+        """
+
+        return self.cube('Jr')
+
+    def grids(self, key):
+        """
+        Return the raw Lat, MLT and Jr grids for a record index or a slice of
+        record indices. Materialized cubes are used when available; the
+        grids returned are always copies, safe to modify.
+        """
+
+        return tuple(np.array(self._cubes[name][key]) if name in self._cubes
+                     else self._read(name, key)
+                     for name in ('Lat', 'MLT', 'Jr'))
+
+    def _read(self, name, key):
+        """
+        Read Lat, MLT or Jr for a record index or slice from file.
+        """
+
+        if name == 'Lat':
+            return _ghost(_grid(91. - self.data.variables['colat'][key],
+                                self.nLat, self.nMLT))
+        if name == 'MLT':
+            return _ghost(_grid(self.data.variables['mlt'][key],
+                                self.nLat, self.nMLT), self.nMLT)
+        return _ghost(_grid(self.data.variables['Jr'][key],
+                            self.nLat, self.nMLT))
+
+
 # For Both Hemispheres
-def ampere_read(fname, t_date, debug=False):
+def ampere_read(fname, t_date, tolerance=None, cache_dir=None, hemi=None,
+                debug=False):
     """
     This function reads in a netCDF file and plots the AMPERE data to screen on
     a polar plot based on Latitude and magnetic local time (MLT) data.
     For reference, AMPERE data for Northern and Southern hemispheres are 
-    accessible separately.
+    accessible separately. To read many times from the same file, use
+    AmpereFile instead, which opens the file only once.
     
     Input:
     ------
         fname     AMPERE event filename for a given hemisphere
         t_date    Time (in YYYY-MM-DD HH:MM:SS UT format)
+        tolerance Optional timedelta (or seconds); if t_date is not a record
+                  time, the nearest record within tolerance is read instead
+        cache_dir Optional directory of the on-disk cache of decoded grids
+                  (see AmpereFile)
+        hemi      'north' or 'south'; taken from the filename by default
     
     Output:
     -------
@@ -42,65 +510,10 @@ def ampere_read(fname, t_date, debug=False):
             
     """
     
-    # Identify if data is of Northern Hemisphere or Southern Hemisphere
-    fchar = []; fchar[:] = fname.split("/")[-1]
-    if (fchar[-14:-9] == ['n', 'o', 'r', 't', 'h']):
-        hemi = 'north'
-    else:
-        hemi = 'south'
-        
-    if debug: print(hemi)
-    
-    # Retrieve data for given Hemisphere!!!
-    data = ncdf.Dataset(fname)
-    
-    # Set Size of Matrices
-    nLat = data.variables['nlat'][0] # Total Number of Latitudes
-    nMLT = data.variables['nlon'][0] # total Number of MLTs
-    nTime = len(data.variables['start_yr']) # Total Number of Minutes
-    
-    if debug: print(nLat, nMLT, nTime)
-    
-    if debug: print(data.variables.keys())
-    
-    # Make 2-D Matrix Map of the Latitude, Longitude and the Field Aligned Current
-    Lat = np.zeros((nLat, nMLT + 1)) # 2D Matrix containing the Latitudes
-    MLT = np.zeros((nLat, nMLT + 1)) # 2D Matrix containing the MLTs
-    J_r = np.zeros((nLat, nMLT + 1)) # 2D Matrix containing the Jr
-    # The + 1 is for the ghost cell on the end of the matrix
-    
-    Time = [] # Time Array
-    # Assign values into Time Array
-    for t in range(len(data.variables['start_yr'])):
-        year = data.variables['start_yr'][t]
-        month = data.variables['start_mo'][t]
-        day = data.variables['start_dy'][t]
-        hour = data.variables['start_hr'][t]
-        minute = data.variables['start_mt'][t]
-        Time.append(dt.datetime(year, month, day, hour, minute, 0))
-    
-    #print(Time[Time.index(t_date)], Time.index(t_date)) # DEBUG
-    t_ind = Time.index(t_date) # Assign index of time you want to see here...
-    
-    if hour >= 0.: # Just a precautionary measure...
-        # Write the data into 2D Matrix Variables
-        for j in range(0, nMLT): # for all MLTs
-            for i in range(0, nLat): # for all Latitudes
-                index = i + j * nLat # Converting a 2D index into 1D
-                
-                # Save the data into the coefficient matrices
-                mlat = 91. - data.variables['colat'][t_ind][index]
-                mlon = data.variables['mlt'][t_ind][index]
-                jr = data.variables['Jr'][t_ind][index]
-                
-                Lat[i][j] = mlat
-                MLT[i][j] = mlon
-                J_r[i][j] = jr
-        # Return of the Ghost Cell
-        for i in range(0, nLat): # for all Latitudes
-            Lat[i][-1] = Lat[i][0]
-            MLT[i][-1] = MLT[i][0] + nMLT
-            J_r[i][-1] = J_r[i][0]
+    with AmpereFile(fname, tolerance=tolerance, cache_dir=cache_dir,
+                    hemi=hemi, debug=debug) as amp:
+        Lat, MLT, J_r = amp.grids(amp.index(t_date))
+        ampere_data = _plottable(Lat, MLT, J_r, amp.hemi)
     
     # DEBUG: Print Data to screen
     if debug:
@@ -108,31 +521,100 @@ def ampere_read(fname, t_date, debug=False):
         print(MLT)
         print(J_r)
     
-    # Convert MLT, Latitude and Jr data into directly plottable values
-    if hemi == 'north':
-        MLT_plot = MLT * np.pi/12. - np.pi/2.
-        Lat_plot = 90. - Lat
-        J_r_plot = J_r
-    else:
-        MLT_plot = MLT * np.pi/12. - np.pi/2.
-        Lat_plot = 90. + Lat
-        J_r_plot = J_r
-    
     # DEBUG: Polar Plot
     if debug:
         ax1 = plt.subplot(111, projection = 'polar') # Polar Plot
-        ax1.contourf(MLT_plot, Lat_plot, J_r_plot, cmap='bwr',
+        ax1.contourf(ampere_data['MLT'], ampere_data['Lat'],
+                     ampere_data['Jr'], cmap='bwr',
                      norm=colors.Normalize(vmin = -1.5, vmax = 1.5))
         plt.show()
 
+    return ampere_data # Return plottable data to user...
 
-    # Save everything in a dictionary
-    ampere_data = {}
-    ampere_data['MLT'] = MLT_plot
-    ampere_data['Lat'] = Lat_plot
-    ampere_data['Jr'] = J_r_plot
 
-    return ampere_data # Return plottable data to user...
+def ampere_files(event_dir, t_date):
+    """
+    Find the Northern and Southern Hemisphere AMPERE files of an event
+    directory that cover a given time.
+    
+    Input:
+    ------
+        event_dir AMPERE event directory, e.g. ./AMPERE/Sept2011_Event_CUSIA/
+        t_date    Time (in YYYY-MM-DD HH:MM:SS UT format)
+    
+    Output:
+    -------
+        dict    Filenames keyed by hemisphere ('north' and 'south').
+            
+    """
+
+    files = {}
+    for fname in sorted(os.listdir(event_dir)):
+        info = parse_fname(fname)
+        if info is None or info['hemi'] in files:
+            continue
+        if info['start'] <= t_date < info['start'] + info['duration']:
+            files[info['hemi']] = os.path.join(event_dir, fname)
+
+    for hemi in ('north', 'south'):
+        if hemi not in files:
+            raise NoRecordError('No {0} AMPERE file for {1} in {2}'
+                                .format(hemi, t_date, event_dir))
+    return files
+
+
+def ampere_read_files(files, t_date, tolerance=None, cache_dir=None,
+                      executor=None):
+    """
+    Read one time from several AMPERE files. By default the files are read
+    one after the other: starting worker processes costs more than reading
+    a single frame. With executor (e.g. a long-lived
+    concurrent.futures.ProcessPoolExecutor, reused over many frames) the
+    files are read concurrently, so the Northern and Southern Hemisphere
+    files are read in about the time of one. Use processes rather than
+    threads: the netCDF-C library is not thread-safe.
+    
+    Input:
+    ------
+        files     Dictionary of AMPERE filenames keyed by hemisphere
+        t_date    Time (in YYYY-MM-DD HH:MM:SS UT format)
+        tolerance See ampere_read
+        cache_dir See ampere_read
+        executor  Optional executor to run the reads on concurrently
+    
+    Output:
+    -------
+        dict    Dictionary of ampere_read dictionaries, keyed by hemisphere.
+            
+    """
+
+    if executor is None:
+        return {hemi: ampere_read(fname, t_date, tolerance=tolerance,
+                                  cache_dir=cache_dir, hemi=hemi)
+                for hemi, fname in files.items()}
+
+    futures = {hemi: executor.submit(ampere_read, fname, t_date,
+                                     tolerance=tolerance, cache_dir=cache_dir,
+                                     hemi=hemi)
+               for hemi, fname in files.items()}
+    return {hemi: future.result() for hemi, future in futures.items()}
+
+
+def ampere_read_pair(event_dir, t_date, tolerance=None, cache_dir=None,
+                     executor=None):
+    """
+    Read both hemispheres of an AMPERE event at a given time. The files are
+    located with ampere_files and read with ampere_read_files.
+    
+    Output:
+    -------
+        dict    {'north': ampere_data, 'south': ampere_data}
+            
+    """
+
+    return ampere_read_files(ampere_files(event_dir, t_date), t_date,
+                             tolerance=tolerance, cache_dir=cache_dir,
+                             executor=executor)
 
 
 #=============================================================================
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+aur_index.py
+------------
+
+This module computes auroral electrojet indices (AU, AL, AE and AO) from
+MAGNIT magnetometer grid output, for any number of runs at once. Each run
+is a directory of per-minute mag_grid_e*.out files.
+
+By default AU and AL are the envelopes of dBn over the whole grid. They can
+also be taken over a subset of grid points, like the real AE network: the
+grid points nearest to a list of stations (e.g. AE_STATIONS), or the grid
+points within a latitude band.
+
+A run can also be a store packed with mag_read.pack_run instead of a
+directory.
+"""
+
+import numpy as np # Numerical Python
+import datetime as dt # Library to work with dates and times
+import os # Files and directories
+import hashlib # Grid layout keys
+from functools import partial # Worker arguments
+from concurrent.futures import ProcessPoolExecutor # Parallel runs
+import mag_read # mag_grid File Reader
+import swmf_read # Output times
+
+INDICES = ('AU', 'AL', 'AE', 'AO')
+
+# The 12 stations of the Kyoto AE index: geographic latitude and longitude
+AE_STATIONS = {'ABK': (68.36, 18.82),   # Abisko
+               'DIK': (73.55, 80.57),   # Dixon
+               'CCS': (77.72, 104.28),  # Cape Chelyuskin
+               'TIK': (71.58, 129.00),  # Tixie
+               'PBK': (70.09, 170.93),  # Pebek
+               'BRW': (71.30, 203.25),  # Barrow
+               'CMO': (64.87, 212.17),  # College
+               'YKC': (62.40, 245.60),  # Yellowknife
+               'FCC': (58.80, 265.90),  # Fort Churchill
+               'SNK': (56.50, 280.80),  # Sanikiluaq
+               'NAQ': (61.16, 314.56),  # Narsarsuaq
+               'LRV': (64.18, 338.30)}  # Leirvogur
+
+# Selected grid points, per grid layout and selection
+_POINTS = {}
+
+
+def _indices(AU, AL):
+    """
+    All indices from the upper and lower envelopes.
+    """
+
+    aur_data = {}
+    aur_data['AU'] = AU
+    aur_data['AL'] = AL
+    aur_data['AE'] = AU - AL
+    aur_data['AO'] = (AU + AL) * 0.5
+    aur_data['missing'] = np.isnan(AU)
+    return aur_data
+
+
+def aurora_index(runs, time1, time2, cadence=dt.timedelta(minutes=1),
+                 max_workers=None, stations=None, lat_band=None):
+    """
+    This function computes AU, AL, AE and AO for several MAGNIT runs. AU and
+    AL are the maximum and minimum of dBn over the grid, taken from the 
+    summary index of each run directory (see mag_read.summary_index); files
+    not yet in an index are read on a process pool, so reruns on the same 
+    output read nothing but the indices. Every run is put on the same time
+    axis; minutes without an output file are gaps (NaN), flagged in 
+    'missing'.
+
+    With stations or lat_band, AU and AL are taken over the selected grid
+    points only (see select_points): dBn of those points is read for every
+    time, and the envelopes are computed for all times at once.
+
+    Input:
+    ------
+        runs        Run directories (or stores, see mag_read.pack_run); a 
+                    list, or a dictionary of directories keyed by run label
+        time1       First time (datetime)
+        time2       Last time (datetime), included
+        cadence     Time between outputs (timedelta)
+        max_workers Number of worker processes (default: one per CPU)
+        stations    Optional virtual stations: a dictionary of (lat, lon)
+                    keyed by station code (e.g. AE_STATIONS), or a list of
+                    (lat, lon), in the coordinates of the mag_grid files
+        lat_band    Optional (min, max) latitude of the grid points to use
+
+    Output:
+    -------
+        dict    'time' (datetime64 array) and, per run label (or directory),
+                a dictionary of 'AU', 'AL', 'AE', 'AO' arrays and the 
+                boolean 'missing' array.
+
+    """
+
+    if not isinstance(runs, dict):
+        runs = {dirname: dirname for dirname in runs}
+    times = np.array(swmf_read.output_times(time1, time2, cadence), 
+                     dtype='datetime64[s]')
+    masked = stations is not None or lat_band is not None
+
+    aur_data = {'time': times}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for label in runs:
+            if masked:
+                points = select_points(runs[label], stations, lat_band)
+                dBn = read_dBn(runs[label], times, executor=pool,
+                               points=points)
+                AU, AL = masked_envelopes(dBn)
+            elif os.path.isfile(runs[label]):
+                dBn = read_dBn(runs[label], times)
+                AU, AL = masked_envelopes(dBn)
+            else:
+                AU, AL = align(mag_read.summary_index(runs[label], 
+                                                      executor=pool), times)
+            aur_data[label] = _indices(AU, AL)
+
+    return aur_data
+
+
+def grid_layout(dirname):
+    """
+    Longitudes and latitudes of the grid points of a mag_grid directory,
+    from its first file, or of a store.
+    """
+
+    if os.path.isfile(dirname):
+        with mag_read.MagStore(dirname) as store:
+            return store.Lon, store.Lat
+
+    fnames = sorted(fname for fname in os.listdir(dirname)
+                    if mag_read.mag_time(fname) is not None)
+    if not fnames:
+        raise ValueError('No mag_grid files in {0}'.format(dirname))
+    data = mag_read.mag_grid_read(os.path.join(dirname, fnames[0]),
+                                  columns=('Lon', 'Lat'))
+    return data['Lon'], data['Lat']
+
+
+def select_points(dirname, stations=None, lat_band=None):
+    """
+    This function returns the grid points (0-based numbers) of a mag_grid
+    directory that stand for a set of stations: per station, the grid point
+    nearest to it on the sphere. With lat_band instead, all grid points
+    with min <= Lat <= max. Selections are cached per grid layout, so runs
+    on the same grid share them.
+    """
+
+    lon, lat = grid_layout(dirname)
+    layout = hashlib.sha1(lon.tobytes() + lat.tobytes()).hexdigest()
+
+    if stations is None:
+        if lat_band is None:
+            raise ValueError('Give either stations or lat_band')
+        key = (layout, 'band', tuple(lat_band))
+    else:
+        if isinstance(stations, dict):
+            stations = list(stations.values())
+        key = (layout, 'stations', tuple(map(tuple, stations)))
+
+    points = _POINTS.get(key)
+    if points is not None:
+        return points
+
+    if stations is None:
+        points = np.flatnonzero((lat >= lat_band[0]) & (lat <= lat_band[1]))
+        if len(points) == 0:
+            raise ValueError('No grid points between {0} and {1} deg'
+                             .format(*lat_band))
+    else:
+        st_lat, st_lon = np.radians(np.array(stations, dtype=float).T)
+        g_lat, g_lon = np.radians(lat), np.radians(lon)
+        # Nearest grid point: largest cosine of the angular distance
+        cos_dist = (np.outer(np.sin(g_lat), np.sin(st_lat)) + 
+                    np.outer(np.cos(g_lat), np.cos(st_lat)) * 
+                    np.cos(g_lon[:, None] - st_lon[None, :]))
+        points = np.argmax(cos_dist, axis=0)
+
+    points.setflags(write=False)
+    _POINTS[key] = points
+    return points
+
+
+def _read_dBn(fname, points=None):
+    dBn = mag_read.mag_grid_read(fname)['dBn']
+    return dBn if points is None else dBn[points]
+
+
+def read_dBn(dirname, times, executor=None, points=None):
+    """
+    dBn of a mag_grid directory (or store) at the given times 
+    (datetime64), as a (time, grid point) array. Times without a file are
+    rows of NaN. With points (see select_points), only those grid points
+    are returned, and workers send back only those.
+    """
+
+    if os.path.isfile(dirname):
+        with mag_read.MagStore(dirname) as store:
+            return store.at(times, 'dBn', points)
+
+    fnames = [mag_read.mag_fname(dirname, t) 
+              for t in times.astype(dt.datetime)]
+    found = [i for i, fname in enumerate(fnames) if os.path.exists(fname)]
+    if not found:
+        return np.full((len(times), 0), np.nan)
+
+    fnames = [fnames[i] for i in found]
+    read = partial(_read_dBn, points=points)
+    if executor is None:
+        rows = list(map(read, fnames))
+    else:
+        rows = list(executor.map(read, fnames,
+                                 chunksize=max(1, len(fnames) // 64)))
+
+    dBn = np.full((len(times), len(rows[0])), np.nan)
+    dBn[found] = rows
+    return dBn
+
+
+def masked_envelopes(dBn, points=None):
+    """
+    Upper and lower envelopes of dBn (AU and AL) over selected grid points
+    (default: all the columns of dBn), for all times at once. Rows of NaN
+    (missing times) stay NaN.
+    """
+
+    if dBn.shape[1] == 0:
+        return np.full(len(dBn), np.nan), np.full(len(dBn), np.nan)
+    subset = dBn if points is None else dBn[:, points]
+    return subset.max(axis=1), subset.min(axis=1)
+
+
+def align(index, times):
+    """
+    Upper and lower envelopes of dBn (AU and AL) of a summary index at the
+    given times (datetime64). Times without a file are NaN.
+    """
+
+    AU = np.full(len(times), np.nan)
+    AL = np.full(len(times), np.nan)
+    if len(index['time']) == 0:
+        return AU, AL
+
+    i = np.clip(np.searchsorted(index['time'], times), 0, 
+                len(index['time']) - 1)
+    found = index['time'][i] == times
+    AU[found] = index['max'][i[found]]
+    AL[found] = index['min'][i[found]]
+    return AU, AL
@@ -13,7 +13,116 @@ Created on Wed Dec  2 03:45:37 2020
 """
 
 import numpy as np
-from spacepy.pybats import rim
+import ifacs # Cached area weights
+
+# Variables of an SWMF IE file needed for the hemispheric power
+HPI_VARIABLES = ('theta', 'psi', 'jr', 'rt rho', 'diff_ave-e', 'diff_e-flux',
+                 'idif_ave-e', 'idif_e-flux', 'mono_e-flux', 'bbnd_n-flux',
+                 'bbnd_e-flux')
+
+# Sources of precipitation
+SOURCES = ('diff', 'idif', 'mono', 'bbnd')
+
+
+def _frames(value, ti):
+        '''
+        Frames ti of a (time, theta, psi) stack; a single (theta, psi) frame
+        is returned as a stack of one.
+        '''
+
+        value = np.asarray(value)
+        return value[ti] if value.ndim == 3 else value[np.newaxis]
+
+
+def calc_hpi_stack(data, chunk=64):
+        '''
+        Integrate auroral energy and number fluxes of all four sources of 
+        precipitation over both hemispheres, for a whole time stack at once.
+
+        The area weights come from the cached ifacs.area_weights and each
+        integral is a single einsum reduction, so apart from one small 
+        temporary per source (processed in chunks of time) no per-frame 
+        arrays are allocated.
+
+        Parameters
+        ==========
+        data : dict
+            Time stack from swmf_read.read_ie_stack(files, HPI_VARIABLES), or
+            a single file from swmf_read.read_ie.
+        chunk : int
+            Number of frames integrated at a time.
+
+        Returns
+        =======
+        dict
+            Columnar table: 'time' (when the data has it) and one time 
+            series per hemisphere, source and quantity, named
+            '<h>_<source>_numflux' (total number flux) and 
+            '<h>_<source>_hpi' (total energy flux, GW), e.g. 'n_diff_hpi'.
+
+        Examples
+        ========
+        >>> files = swmf_read.ie_files('./SWMF-MAGNIT/Sept2011_Event_CUSIA/')
+        >>> stack = swmf_read.read_ie_stack(files, HPI_VARIABLES)
+        >>> table = calc_hpi_stack(stack)
+        >>> print(table['n_mono_hpi'])
+
+        '''
+
+        # Calculate some physically meaningful values/units
+        units_eflux = 1E-9 # Watts to GigaWatts
+        units_numflux = 1E+04 # cm^-2 to m^-2
+        R = (6371.0+110.0)*1000.0 # Radius of Earth + iono altitude
+
+        # Constant factors of each integral
+        scale = {
+            'diff_numflux': units_numflux*R**2 * 
+                            (1E03 * 11604)**0.5 * 1553.5632/1.66E-21,
+            'idif_numflux': units_numflux*R**2 * 
+                            (1E03 * 11604 * 5)**0.5 * 36.26531/1.66E-21,
+            'mono_numflux': 1E-06*R**2 / 1.6e-19,
+            'bbnd_numflux': units_numflux*R**2,
+            }
+        for src in SOURCES:
+            scale[src+'_hpi'] = units_eflux*R**2
+
+        table = {}
+        if 'time' in data:
+            table['time'] = data['time']
+        stacked = np.ndim(data['n_jr']) == 3
+        nTime = np.shape(data['n_jr'])[0] if stacked else 1
+
+        for h in ('n', 's'):
+            weights = ifacs.area_weights(data[h+'_theta'], data.dlat, 
+                                         data.dlon)
+            out = {key: np.empty(nTime) for key in scale}
+
+            for t0 in range(0, nTime, chunk):
+                ti = slice(t0, t0 + chunk)
+                var = lambda name: _frames(data[h+'_'+name], ti)
+
+                # Number Fluxes
+                out['diff_numflux'][ti] = np.einsum('...ij,...ij,ij->...', 
+                    var('rt rho'), np.sqrt(var('diff_ave-e')), weights)
+                out['idif_numflux'][ti] = np.einsum('...ij,...ij,ij->...',
+                    var('rt rho'), np.sqrt(var('idif_ave-e')), weights)
+                # Upward FAC signify downward electrons
+                out['mono_numflux'][ti] = np.einsum('...ij,ij->...',
+                    np.maximum(var('jr'), 0.), weights)
+                out['bbnd_numflux'][ti] = np.einsum('...ij,ij->...',
+                    var('bbnd_n-flux'), weights)
+
+                # Energy Fluxes
+                for src in SOURCES:
+                    out[src+'_hpi'][ti] = np.einsum('...ij,ij->...', 
+                        var(src+'_e-flux'), weights)
+
+            for key in scale:
+                col = scale[key] * out[key]
+                table[h+'_'+key] = col if stacked else col[0]
+
+        return table
+
 
 def calc_hpi(a, debug=False):
         '''
@@ -29,10 +138,11 @@ def calc_hpi(a, debug=False):
             'mono': Monoenergetic
             'bbnd': Broadband
         and may be accessed via self['n_diff']['tot_aur_hpi'], etc.
+        For many files, use calc_hpi_stack on a time stack instead.
 
         Parameters
         ==========
-        dict
+        dict (swmf_read.read_ie or spacepy.pybats.rim.Iono object)
 
         Returns
         =======
@@ -41,89 +151,29 @@ def calc_hpi(a, debug=False):
 
         Examples
         ========
-        >>> a = rim.Iono('spacepy/tests/data/pybats_test/it000321_104510_000.idl.gz')
-        >>> a.calc_I()
+        >>> a = swmf_read.read_ie('it000321_104510_000.idl')
+        >>> a = calc_hpi(a)
         >>> print(a['n_diff']['tot_numflux'])
         
         '''
 
-        # Calculate some physically meaningful values/units
-        units_eflux = 1E-9 # Watts to GigaWatts
-        units_numflux = 1E+04 # cm^-2 to m^-2
-        R = (6371.0+110.0)*1000.0 # Radius of Earth + iono altitude
-        dTheta = np.pi * a.dlat/180.
-        dPhi   = np.pi * a.dlon/180.
-        
+        table = calc_hpi_stack(a)
+
         hemi = ['n', 's']
+        names = {'diff': 'Diffuse:   ', 'idif': 'IonDiff:   ', 
+                 'mono': 'Mono:      ', 'bbnd': 'Broadband: '}
         
         for h in hemi:
-            # Get relevant values:
-            colat     = a[h+'_theta']*np.pi/180.
-            
-            # -----DIFFUSE PRECIP-----
-            a[h+'_diff'] = {}
-            # Number Flux
-            t = a[h+'_diff_ave-e'] * 1E03 * 11604
-            diff_numflux = a[h+'_rt rho'] * t**0.5 * 1553.5632/1.66E-21
-            integrand = (diff_numflux * np.sin(colat) * dTheta*dPhi)
-            a[h+'_diff']['tot_numflux'] = units_numflux*R**2 * np.sum(integrand)
-            # Energy Flux
-            integrand = (a[h+'_diff_e-flux'] * np.sin(colat) * dTheta*dPhi)
-            a[h+'_diff']['tot_aur_hpi'] = units_eflux*R**2 * np.sum(integrand)
-            
-            if debug:
-                print((h+'-Diffuse:   ' +
-                   'Total Number Flux = {:4.3E}   ' + 
-                   'Auroral HPI = {:.3f}').format(a[h+'_diff']['tot_numflux'], 
-                                                  a[h+'_diff']['tot_aur_hpi']))
-                                                  
-            # -----ION DIFF PRECIP-----
-            a[h+'_idif'] = {}
-            # Number Flux
-            t = a[h+'_idif_ave-e'] * 1E03 * 11604 * 5
-            idif_numflux = a[h+'_rt rho'] * t**0.5 * 36.26531/1.66E-21
-            integrand = (idif_numflux * np.sin(colat) * dTheta*dPhi)
-            a[h+'_idif']['tot_numflux'] = units_numflux*R**2 * np.sum(integrand)
-            # Energy Flux
-            integrand = (a[h+'_idif_e-flux'] * np.sin(colat) * dTheta*dPhi)
-            a[h+'_idif']['tot_aur_hpi'] = units_eflux*R**2 * np.sum(integrand)
-            
-            if debug:
-                print((h+'-IonDiff:   ' +
-                   'Total Number Flux = {:4.3E}   ' + 
-                   'Auroral HPI = {:.3f}').format(a[h+'_idif']['tot_numflux'], 
-                                                  a[h+'_idif']['tot_aur_hpi']))
-
-            # -----MONOENERGETIC PRECIP-----
-            a[h+'_mono'] = {}
-            # Number Flux
-            loc_up = a[h+'_jr']>0 # Upward FAC signify downward electrons
-            integrand = a[h+'_jr']*np.sin(colat)*dTheta*dPhi/1.6e-19
-            a[h+'_mono']['tot_numflux'] = 1E-06*R**2 * np.sum(integrand[loc_up])
-            # Energy Flux
-            integrand = (a[h+'_mono_e-flux'] * np.sin(colat) * dTheta*dPhi)
-            a[h+'_mono']['tot_aur_hpi'] = units_eflux*R**2 * np.sum(integrand)
-        
-            if debug:
-                print((h+'-Mono:      ' +
-                   'Total Number Flux = {:4.3E}   ' + 
-                   'Auroral HPI = {:.3f}').format(a[h+'_mono']['tot_numflux'], 
-                                                  a[h+'_mono']['tot_aur_hpi']))
-
-            # -----BROADBAND PRECIP-----
-            a[h+'_bbnd'] = {}
-            # Number Flux
-            integrand = (a[h+'_bbnd_n-flux'] * np.sin(colat) * 
-                         dTheta*dPhi)
-            a[h+'_bbnd']['tot_numflux'] = units_numflux*R**2 * np.sum(integrand)
-            # Energy Flux
-            integrand = (a[h+'_bbnd_e-flux'] * np.sin(colat) * dTheta*dPhi)
-            a[h+'_bbnd']['tot_aur_hpi'] = units_eflux*R**2 * np.sum(integrand)
+            for src in SOURCES:
+                a[h+'_'+src] = {}
+                a[h+'_'+src]['tot_numflux'] = table[h+'_'+src+'_numflux']
+                a[h+'_'+src]['tot_aur_hpi'] = table[h+'_'+src+'_hpi']
             
-            if debug:
-                print((h+'-Broadband: ' +
-                   'Total Number Flux = {:4.3E}   ' + 
-                   'Auroral HPI = {:.3f}').format(a[h+'_bbnd']['tot_numflux'], 
-                                                  a[h+'_bbnd']['tot_aur_hpi']))
+                if debug:
+                    print((h+'-'+names[src] +
+                       'Total Number Flux = {:4.3E}   ' + 
+                       'Auroral HPI = {:.3f}').format(
+                           a[h+'_'+src]['tot_numflux'], 
+                           a[h+'_'+src]['tot_aur_hpi']))
 
-        return a
\ No newline at end of file
+        return a
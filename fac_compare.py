@@ -19,238 +19,488 @@ import swmf_read # SWMF IE File Reader
 import ifacs # Integrated FACs Calculator
 import numpy as np # Numerical Python
 import matplotlib.pyplot as plt # Mathematical Plotting Library
-import netCDF4 as ncdf # Library to read in netCDF files
 import datetime as dt # Library to work with dates and times
-from matplotlib.colors import LinearSegmentedColormap as lsc # Better Contour colormap
-from spacepy.pybats import rim # To read in SWMF files
+import os # Files and directories
 import matplotlib.colors as colors # Module required to use Normalize function
 from matplotlib.ticker import MaxNLocator # Ticks Operations
+from matplotlib.figure import Figure # Persistent figures
+from matplotlib.backends.backend_agg import FigureCanvasAgg # Headless canvas
+from concurrent.futures import ProcessPoolExecutor # Parallel rendering
+import argparse # Command line interface
+import collections # Frames in flight
 
 
-#====================== AMPERE FILE INFORMATION ==============================
+# Default data and plot folders; one subfolder per event
+AMPERE_ROOT = './AMPERE/'
+SWMF_ROOT = './SWMF-MAGNIT/'
+PLOT_ROOT = './Plots/'
 
-# AMPERE time start - This should be fixed in future renditions of this code!
-tstart = dt.datetime(2011, 9, 26, 10, 0, 0) # Convert the numbers into a datetime
-t = tstart.timetuple() # Stripped the numbers into a timetuple
-
-northfile = (('./AMPERE/Sept2011_Event_CUSIA/' + 
-              '{0:4d}{1:0=2d}{2:0=2d}.{3:0=2d}00.86400.120.north.grd.ncdf')
-             .format(t[0], t[1], t[2], t[3]))
-
-southfile = (('./AMPERE/Sept2011_Event_CUSIA/' + 
-              '{0:4d}{1:0=2d}{2:0=2d}.{3:0=2d}00.86400.120.south.grd.ncdf')
-             .format(t[0], t[1], t[2], t[3]))
-
-# Path to Plots Folder
-fpath = './Plots/Sept2011_Event_CUSIA/'
+# Size of the comparison figure (inches); frames are FIGSIZE * dpi pixels
+FIGSIZE = (12, 9)
 
 #=============================================================================
 #=============================================================================
 #=============================================================================
 
+def load_frame(nAMPERE_file, sAMPERE_file, SWMF_fname, time, ie_cache=None,
+               executor=None, ampere=None, cache_dir=None):
+    """
+    Read everything a comparison frame shows: the AMPERE grids of both
+    hemispheres, the SWMF grids and the four iFACs. With ampere, a 
+    dictionary of open AmpereFile objects keyed by filename, the AMPERE
+    frames are taken from those files instead of reopening them, and so
+    is the iFAC series of the files. cache_dir is the AMPERE cache
+    directory (see AmpereFile) of the files that are opened.
+
+    Output:
+    -------
+        dict    'north' and 'south' (see ampere_read), 'SWMF' (see 
+                swmf_read) and 'ifac', a dictionary of total iFACs (MA) 
+                keyed 'n_AMPERE', 's_AMPERE', 'n_SWMF' and 's_SWMF'.
+
+    """
+
+    files = {'north': nAMPERE_file, 'south': sAMPERE_file}
+    if ampere is not None:
+        AMPERE = {hemi: ampere[fname][time] for hemi, fname in files.items()}
+    else:
+        AMPERE = ampere_read.ampere_read_files(files, time,
+                                               cache_dir=cache_dir,
+                                               executor=executor)
+    # The IE file is parsed once, for both the plot and the iFACs
+    SWMF_data = swmf_read.load_ie(SWMF_fname, swmf_read.FAC_VARIABLES, 
+                                  ie_cache)
+
+    frame = {'north': AMPERE['north'], 'south': AMPERE['south'],
+             'SWMF': swmf_read.swmf_read(SWMF_data)}
+
+    # AMPERE iFACs, looked up from the whole-file time series
+    n_amp_ifac, s_amp_ifac = ifacs.lookup_I_ampere(files, time, cache_dir,
+                                                   ampere)
+    n_swmf_ifac, s_swmf_ifac = ifacs.calc_I_swmf(SWMF_data)
+    frame['ifac'] = {'n_AMPERE': n_amp_ifac, 's_AMPERE': s_amp_ifac,
+                     'n_SWMF': n_swmf_ifac, 's_SWMF': s_swmf_ifac}
+
+    return frame
+
+
+def frame_fname(plot_dir, time):
+    """
+    Filename of the comparison plot of a given time.
+    """
+
+    return os.path.join(plot_dir, time.strftime('%Y%m%d_%H%M%S_000.png'))
+
+
+class FacFigure(object):
+    """
+    Four-panel comparison figure (AMPERE and SWMF, North and South), built
+    once and redrawn frame after frame.
+
+    The figure, polar axes, ticks, titles and static labels are set up when
+    the FacFigure is created, and the colorbar with the first frame. Each
+    update() only replaces the filled contours, the time label and the iFAC
+    values, so rendering a sequence costs little more than the contouring.
+    Jr is saturated at +/- sat_point, so the contour levels are the same
+    for every frame.
+
+    Without fig, the figure is drawn on its own Agg canvas: nothing is 
+    shown and pyplot is not involved, so it runs headless.
+
+        >>> figure = FacFigure(1.5)
+        >>> for time in times:
+        ...     figure.update(load_frame(nfile, sfile, swmf_fname, time), time)
+        ...     figure.save(frame_fname(plot_dir, time))
+    """
+
+    # Panels: AMPERE North, SWMF North, AMPERE South, SWMF South
+    _PANELS = ('n_AMPERE', 'n_SWMF', 's_AMPERE', 's_SWMF')
+
+    def __init__(self, sat_point, lines=False, max_colat=40., fig=None,
+                 n_levels=20):
+        self.sat_point = sat_point
+        self.lines = lines
+        self.lev = np.linspace(-1. * sat_point, sat_point, n_levels)
+        self.norm = colors.Normalize(vmin = -1. * sat_point, vmax = sat_point)
+
+        if fig is None:
+            fig = Figure(figsize=FIGSIZE)
+            FigureCanvasAgg(fig)
+        self.fig = fig
+
+        ax1 = fig.add_subplot(221, projection = 'polar') # Polar Plot
+        ax2 = fig.add_subplot(222, projection = 'polar') # Polar Plot
+        ax3 = fig.add_subplot(223, projection = 'polar') # Polar Plot
+        ax4 = fig.add_subplot(224, projection = 'polar') # Polar Plot
+        self.axes = [ax1, ax2, ax3, ax4]
+
+        self.cb = None # Colorbar, with the first frame
+        self._contours = [] # Contour sets of the current frame
+
+        # Latitudinal Limit
+        for ax in self.axes:
+            ax.set_ylim(0., max_colat)
+
+        # ========================
+        # MLT + Latitudinal Labels
+
+        xticks = [0, 45.*np.pi/180., np.pi/2, 135.*np.pi/180., np.pi, 
+                  225.*np.pi/180., 3*np.pi/2, 315.*np.pi/180.]
+        mlt_labels = [['06', '', '', '', '', '', '00 MLT', ''],
+                      ['06', '', '', '', '18', '', '00 MLT', ''],
+                      ['06', '', '12', '', '', '', '00 MLT', ''],
+                      ['06', '', '12', '', '18', '', '00 MLT', '']]
+        for ax, labels in zip(self.axes, mlt_labels):
+            ax.set_xticks(xticks)
+            ax.set_xticklabels(labels)
+
+        # Limiting the Latitude
+        lat_labels = ['$N$', '', r'70$^0$', '', r'50$^0$']
+        yticks = [0, 10, 20, 30, 40]
+
+        for ax in self.axes:
+            ax.tick_params(labelsize=15)
+            ax.set_yticks(yticks)
+            ax.set_yticklabels(lat_labels)
+
+        # Set Titles
+        ax1.set_ylabel('Northern', fontsize = 25)
+        ax3.set_ylabel('Southern', fontsize = 25)
+        ax1.set_title('AMPERE', fontsize = 25)
+        ax2.set_title('SWMF-MAGNIT', fontsize = 25)
+
+        # Time label, set per frame
+        ax4.set_xlabel('', fontsize=20, labelpad = 15)
+
+        # Integrated FAC labels; values set per frame
+        self.ifac_text = {}
+        for panel, ax in zip(self._PANELS, self.axes):
+            ax.text(0.8, 0.075, 'iFAC (Total)', fontsize=15, 
+                    transform=ax.transAxes, verticalalignment='top')
+            self.ifac_text[panel] = ax.text(0.8, 0.00, '', fontsize=15, 
+                                            transform=ax.transAxes, 
+                                            verticalalignment='top')
+
+    def _grids(self, frame):
+        """
+        MLT, Lat and saturated Jr of each panel.
+        """
+
+        SWMF = frame['SWMF']
+        grids = [(frame['north']['MLT'], frame['north']['Lat'], 
+                  frame['north']['Jr']),
+                 (SWMF['n_MLT'], SWMF['n_Lat'], SWMF['n_Jr']),
+                 (frame['south']['MLT'], frame['south']['Lat'], 
+                  frame['south']['Jr']),
+                 (SWMF['s_MLT'], SWMF['s_Lat'], SWMF['s_Jr'])]
+        return [(MLT, Lat, np.clip(J_r, -1. * self.sat_point, self.sat_point))
+                for MLT, Lat, J_r in grids]
+
+    def update(self, frame, time):
+        """
+        Draw a frame (see load_frame) for a given time (datetime).
+        """
+
+        for contour in self._contours:
+            contour.remove()
+        self._contours = []
+
+        for ax, (MLT, Lat, J_r) in zip(self.axes, self._grids(frame)):
+            # Filled Contour Plot with Geometry
+            self._contours.append(ax.contourf(MLT, Lat, J_r, self.lev, 
+                                              cmap='bwr', norm=self.norm))
+            # Normal Contour Plot for lines
+            if self.lines:
+                self._contours.append(ax.contour(MLT, Lat, J_r, self.lev,
+                                                 linewidths = 0.75, 
+                                                 colors = 'k'))
+
+        # Common Colour Bar
+        if self.cb is None:
+            self.cb = self.fig.colorbar(self._contours[0], 
+                                        ticks = MaxNLocator(8), shrink=0.85, 
+                                        pad=0.08, ax = self.axes)
+            self.cb.set_label(r'FAC ($\mu A/m^2$)', fontsize=25, 
+                              fontdict = {'color' : 'k'})
+            self.cb.ax.tick_params(labelsize=18, colors = 'k')
+
+        self.axes[3].xaxis.label.set_text(
+            time.strftime('Time: %Y-%m-%d %H:%M:%S UT'))
+        for panel in self._PANELS:
+            self.ifac_text[panel].set_text(
+                '{:.2f} MA'.format(frame['ifac'][panel]))
+
+    def save(self, fname, dpi=300):
+        self.fig.savefig(fname, dpi = dpi)
+
+    def rgb(self, dpi=300):
+        """
+        The current frame as an (height, width, 3) RGB array, drawn straight
+        from the canvas buffer, e.g. to stream to a video writer.
+        """
+
+        self.fig.set_dpi(dpi)
+        self.fig.canvas.draw()
+        # Copy the RGB channels only; no RGBA copy is kept alive
+        return np.asarray(self.fig.canvas.buffer_rgba())[:, :, :3].copy()
+
+
 def fac_plot(nAMPERE_file, sAMPERE_file, SWMF_fname, sat_point, time, 
-             lines=False, debug=False, max_colat = 40.):
+             lines=False, debug=False, max_colat = 40., ie_cache=None,
+             figure=None, plot_dir='.'):
     """
 
     Parameters
     ----------
-    n_AMPERE : Dictionary
-        Contains values from the AMPERE Northern Hemipshere.
-    s_AMPERE : Dictionary
-        Contains values from the AMPERE Southern Hemipshere.
-    SWMF : Dictionary
-        Contains values from the SWMF IE File.
+    nAMPERE_file : str
+        AMPERE Northern Hemisphere file.
+    sAMPERE_file : str
+        AMPERE Southern Hemisphere file.
+    SWMF_fname : str
+        SWMF IE File.
     sat_point : float
         Contains saturation point value.
+    time : datetime
+        Time of the frame.
+    ie_cache : Dictionary, optional
+        Parse cache of SWMF IE files shared across calls (see 
+        swmf_read.load_ie).
+    figure : FacFigure, optional
+        Persistent figure to draw on; nothing is shown. Without it, a new
+        figure is made, saved and shown.
+    plot_dir : str, optional
+        Plots folder; defaults to the current folder.
 
     Returns
     -------
     None. Saves Plot...
 
     """
-    
-    # Read in files and store data onto dictionaries
-    n_AMPERE = ampere_read.ampere_read(nAMPERE_file, t_date)#, debug=True)
-    s_AMPERE = ampere_read.ampere_read(sAMPERE_file, t_date)#, debug=True)
-    SWMF = swmf_read.swmf_read(swmf_fname)#, debug=True)
-    
-    
-    
-    fig = plt.figure(figsize=(12,9))
-    ax1 = plt.subplot(221, projection = 'polar') # Polar Plot
-    ax2 = plt.subplot(222, projection = 'polar') # Polar Plot
-    ax3 = plt.subplot(223, projection = 'polar') # Polar Plot
-    ax4 = plt.subplot(224, projection = 'polar') # Polar Plot
-    axes = [ax1, ax2, ax3, ax4] # Required for colorbar later...
-    
-    # Saturate Plots
-    for J_r in (n_AMPERE['Jr'], s_AMPERE['Jr'], SWMF['n_Jr'], SWMF['s_Jr']):
-        loc = J_r > sat_point
-        J_r[loc] = sat_point
-
-        loc = J_r < (-1 * sat_point)
-        J_r[loc] = -1 * sat_point
-    
-    if debug: print(np.max(SWMF['n_Jr']))
-    
-    # Contour levels
-    n = 20
-    max_jr = np.max([np.max(n_AMPERE['Jr']), np.max(s_AMPERE['Jr']), 
-                     np.max(SWMF['n_Jr']), np.max(SWMF['s_Jr']), sat_point])
-    min_jr = np.min([np.min(n_AMPERE['Jr']), np.min(s_AMPERE['Jr']), 
-                     np.min(SWMF['n_Jr']), np.min(SWMF['s_Jr']), -1. * sat_point])
-    lev = np.linspace(min_jr, max_jr, n)
-    
-    if debug: print(max_jr, min_jr)
-    
-    font = {
-            'color' : 'k'
-            }
-    label_color = 'k'
-    
-    
-    
-    # Filled Contour Plot with Geometry
-    amp_north = ax1.contourf(n_AMPERE['MLT'], n_AMPERE['Lat'], n_AMPERE['Jr'], 
-                             lev, cmap='bwr', norm=colors.Normalize(
-                                 vmin = min_jr, vmax = max_jr))
-    amp_south = ax3.contourf(s_AMPERE['MLT'], s_AMPERE['Lat'], s_AMPERE['Jr'], 
-                             lev, cmap='bwr', norm=colors.Normalize(
-                                 vmin = min_jr, vmax = max_jr)) 
-    
-    swm_north = ax2.contourf(SWMF['n_MLT'], SWMF['n_Lat'], SWMF['n_Jr'], 
-                             lev, cmap='bwr', norm=colors.Normalize(
-                                 vmin = min_jr, vmax = max_jr)) 
-    swm_south = ax4.contourf(SWMF['s_MLT'], SWMF['s_Lat'], SWMF['s_Jr'], 
-                             lev, cmap='bwr', norm=colors.Normalize(
-                                 vmin = min_jr, vmax = max_jr)) 
-            
-    # Normal Contour Plot for lines
-    if lines:
-        ax1.contour(n_AMPERE['MLT'], n_AMPERE['Lat'], n_AMPERE['Jr'], lev,
-                    linewidths = 0.75, colors = 'k')
-        ax2.contour(s_AMPERE['MLT'], s_AMPERE['Lat'], s_AMPERE['Jr'], lev,
-                    linewidths = 0.75, colors = 'k')
-        ax3.contour(SWMF['n_MLT'], SWMF['n_Lat'], SWMF['n_Jr'], lev,
-                    linewidths = 0.75, colors = 'k')
-        ax4.contour(SWMF['s_MLT'], SWMF['s_Lat'], SWMF['s_Jr'], lev,
-                    linewidths = 0.75, colors = 'k')
-
-            
-    # Common Colour Bar
-    cbarticks = MaxNLocator(8)
-    cb = fig.colorbar(amp_north, ticks = cbarticks, shrink=0.85, pad=0.08, 
-                      ax = axes)
-    cb.set_label('FAC ($\mu A/m^2$)', fontsize=25, fontdict = font)
-    cb.ax.tick_params(labelsize=18, colors = label_color)
-    
-    # Latitudinal Limit
-    for ax in axes:
-        ax.set_ylim(0., max_colat)
-    
-    # ========================
-    # MLT + Latitudinal Labels
-    
-    xticks = [0, 45.*np.pi/180., np.pi/2, 135.*np.pi/180., np.pi, 
-              225.*np.pi/180., 3*np.pi/2, 315.*np.pi/180.]
-    # ax1
-    mlt_labels = ['06', '', '', '', '', '', '00 MLT', '']
-    ax1.set_xticks(xticks)
-    ax1.set_xticklabels(mlt_labels)
-    
-    # ax2
-    mlt_labels = ['06', '', '', '', '18', '', '00 MLT', '']
-    ax2.set_xticks(xticks)
-    ax2.set_xticklabels(mlt_labels)
-    
-    # ax3
-    mlt_labels = ['06', '', '12', '', '', '', '00 MLT', '']
-    ax3.set_xticks(xticks)
-    ax3.set_xticklabels(mlt_labels)
-    
-    # ax4
-    mlt_labels = ['06', '', '12', '', '18', '', '00 MLT', '']
-    ax4.set_xticks(xticks)
-    ax4.set_xticklabels(mlt_labels)
-    
-    # Limiting the Latitude
-    lat_labels = ['$N$', '', r'70$^0$', '', r'50$^0$']
-    #yticks = np.linspace(0, 30., 16)
-    yticks = [0, 10, 20, 30, 40]
-    
-    for ax in axes:
-        ax.tick_params(labelsize=15)#, colors = 'white')
-        ax.set_yticks(yticks)
-        ax.set_yticklabels(lat_labels)
-        
-    # Set Titles
-    ax1.set_ylabel('Northern', fontsize = 25)
-    ax3.set_ylabel('Southern', fontsize = 25)
-    ax1.set_title('AMPERE', fontsize = 25)
-    ax2.set_title('SWMF-MAGNIT', fontsize = 25)
-    
-    t_label = ('Time: {0}-{1:0=2d}-{2:0=2d} ' + 
-               '{3:0=2d}:{4:0=2d}:{5:0=2d} UT').format(t[0], t[1], t[2], t[3], 
-                                                      t[4], t[5])
-    plt.xlabel(t_label, fontsize=20, labelpad = 15)
-    
-    # Integrated FAC printing
-    
-    ifac = 10.23456
-    # ax1
-    plt.text(0.8, 0.075, 'iFAC (Total)', fontsize=15, transform=ax1.transAxes,
-             verticalalignment='top')
-    plt.text(0.8, 0.00, 'N/A', fontsize=15, 
-             transform=ax1.transAxes, verticalalignment='top')
-    
-    # ax2
-    plt.text(0.8, 0.075, 'iFAC (Total)', fontsize=15, transform=ax3.transAxes,
-             verticalalignment='top')
-    plt.text(0.8, 0.00, 'N/A', fontsize=15, 
-             transform=ax3.transAxes, verticalalignment='top')
-    
-    
-    # SWMF iFACs
-    n_swmf_ifac, s_swmf_ifac = ifacs.calc_I_swmf(SWMF_fname)
-    
-    # ax3
-    plt.text(0.8, 0.075, 'iFAC (Total)', fontsize=15, transform=ax2.transAxes,
-             verticalalignment='top')
-    plt.text(0.8, 0.00, '{:.2f} MA'.format(n_swmf_ifac), fontsize=15, 
-             transform=ax2.transAxes, verticalalignment='top')
-    
-    # ax4
-    plt.text(0.8, 0.075, 'iFAC (Total)', fontsize=15, transform=ax4.transAxes,
-        verticalalignment='top')
-    plt.text(0.8, 0.00, '{:.2f} MA'.format(s_swmf_ifac), fontsize=15, 
-             transform=ax4.transAxes, verticalalignment='top')
-
-    savefile = (fpath + '{0}{1:0=2d}{2:0=2d}_' + 
-               '{3:0=2d}{4:0=2d}{5:0=2d}_000').format(t[0], t[1], t[2], t[3], 
-                                                      t[4], t[5])            
-    plt.savefig(savefile, dpi = 300)#, transparent = True)
+
+    frame = load_frame(nAMPERE_file, sAMPERE_file, SWMF_fname, time, 
+                       ie_cache)
+    if debug: print(np.max(frame['SWMF']['n_Jr']))
+
+    savefile = frame_fname(plot_dir, time)
+    if figure is not None:
+        figure.update(frame, time)
+        figure.save(savefile)
+        return
+
+    figure = FacFigure(sat_point, lines, max_colat, 
+                       fig=plt.figure(figsize=FIGSIZE))
+    figure.update(frame, time)
+    figure.save(savefile)
     plt.show(); plt.close()
 
-#=============================================================================
-#=============================================================================
-#=============================================================================
+# Per-process rendering state: figure and open AMPERE files
+_WORKER = {}
+
+
+def _render_frame(job):
+    """
+    Render one frame (worker process) on the persistent, headless figure of
+    this process; AMPERE files are opened once per process. Returns the 
+    time, the PNG filename (or None), the RGB array for a video (or None) 
+    and, for frames skipped because an input file is missing or AMPERE has
+    no record at this time, the reason. Any other error is raised.
+    """
+
+    event, time, options = job
+    if _WORKER.get('options') != options:
+        for amp in _WORKER.get('ampere', {}).values():
+            amp.close()
+        _WORKER.update(options=options, ampere={},
+                       figure=FacFigure(options['sat_point'], 
+                                        options['lines']))
+    ampere, figure = _WORKER['ampere'], _WORKER['figure']
+
+    try:
+        files = ampere_read.ampere_files(
+            os.path.join(options['ampere_root'], event), time)
+        for fname in files.values():
+            if fname not in ampere:
+                ampere[fname] = ampere_read.AmpereFile(
+                    fname, cache_dir=options['cache_dir'])
+        swmf_fname = swmf_read.ie_fname(
+            os.path.join(options['swmf_root'], event), time)
+        frame = load_frame(files['north'], files['south'], swmf_fname, time,
+                           ampere=ampere, cache_dir=options['cache_dir'])
+    except (FileNotFoundError, ampere_read.NoRecordError) as error:
+        return time, None, None, str(error)
+
+    figure.update(frame, time)
+    fname = rgb = None
+    if options['video']:
+        rgb = figure.rgb(options['dpi'])
+    if options['png']:
+        fname = frame_fname(os.path.join(options['plot_root'], event), time)
+        if rgb is None:
+            figure.save(fname, dpi=options['dpi'])
+        else:
+            plt.imsave(fname, rgb, dpi=options['dpi']) # Drawn already
+
+    return time, fname, rgb, None
+
+
+def render(event, t_start, t_end, cadence=dt.timedelta(minutes=2), 
+           max_workers=None, sat_point=1.5, lines=False, dpi=300, 
+           ampere_root=AMPERE_ROOT, swmf_root=SWMF_ROOT, plot_root=PLOT_ROOT,
+           cache_dir=None, video=None, png=True, fps=10, codec='MJPG',
+           max_buffer=512, debug=False):
+    """
+    This function renders the FAC comparison plots of an event between two
+    times, on a process pool. Each worker process renders on its own 
+    headless FacFigure, frame after frame. PNGs are named after the frame
+    time (see frame_fname), so the output does not depend on the number of
+    workers.
+
+    With video, frames are also written, in time order, to a video file:
+    the workers send the rendered canvases as RGB arrays straight to the
+    video writer (see fac_video.open_writer), and PNGs are optional. The
+    frames in flight (rendered, or waiting for the writer) are capped at
+    max_buffer MB of RGB arrays, and at four per worker.
+
+    The resolution of the video is set by dpi: a frame is FIGSIZE * dpi
+    pixels, 3 bytes each, i.e. about 29 MB at 300 dpi and 3 MB at 100 dpi.
+    At high dpi, max_buffer holds fewer frames than there are workers and
+    rendering slows down; render videos at a lower dpi than print-quality
+    PNGs (e.g. 100-150 dpi, 1200x900 to 1800x1350 pixels), or raise
+    max_buffer if the memory is there.
+
+    Input:
+    ------
+        event       Event name, e.g. Sept2011_Event_CUSIA; the subfolder of
+                    ampere_root, swmf_root and plot_root to use
+        t_start     First time (datetime)
+        t_end       Last time (datetime), included
+        cadence     Time between frames (timedelta)
+        max_workers Number of worker processes (default: one per CPU)
+        sat_point   Saturation point of Jr (muA/m^2)
+        lines       Draw contour lines too
+        dpi         Resolution of the frames (dots per inch)
+        cache_dir   Optional AMPERE cache directory (see AmpereFile)
+        video       Optional video filename
+        png         Save the PNGs
+        fps         Frames per second of the video
+        codec       FourCC code of the video codec
+        max_buffer  Largest size (MB) of the video frames in flight
+
+    Output:
+    -------
+        tuple   (times of the rendered frames, in order, and list of 
+                (time, reason) of the frames skipped for missing inputs).
+                PNG filenames follow from the times (see frame_fname).
+
+    """
+
+    times = swmf_read.output_times(t_start, t_end, cadence)
+    if png:
+        os.makedirs(os.path.join(plot_root, event), exist_ok=True)
+    options = {'sat_point': sat_point, 'lines': lines, 'dpi': dpi,
+               'ampere_root': ampere_root, 'swmf_root': swmf_root,
+               'plot_root': plot_root, 'cache_dir': cache_dir,
+               'video': video is not None, 'png': png}
+
+    if video is not None:
+        import fac_video # OpenCV is only needed for videos
+    writer = None
+    done, skipped = [], []
+
+    def collect(result):
+        nonlocal writer
+        time, fname, rgb, reason = result
+        if reason is not None:
+            skipped.append((time, reason))
+            return
+        if rgb is not None:
+            if writer is None:
+                writer = fac_video.open_writer(
+                    video, (rgb.shape[1], rgb.shape[0]), fps, codec)
+            fac_video.write_rgb(writer, rgb)
+        done.append(time)
+        if debug: print(time if fname is None else fname)
+
+    n_workers = max_workers or os.cpu_count()
+    window = 4 * n_workers # Frames in flight
+    if video is not None:
+        frame_mb = FIGSIZE[0] * FIGSIZE[1] * dpi**2 * 3 / 2.**20
+        window = max(1, min(window, int(max_buffer // frame_mb)))
+    pending = collections.deque()
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            for time in times:
+                pending.append(pool.submit(_render_frame, 
+                                           (event, time, options)))
+                # Frames are collected in time order
+                if len(pending) >= window:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+    finally:
+        if writer is not None:
+            writer.release()
+
+    return done, skipped
+
+
 #=============================================================================
 
 # MAIN FUNCTION:
 
-# The Great Loop of our times....
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Render AMPERE vs SWMF FAC comparison plots.')
+    parser.add_argument('event', help='Event name, e.g. Sept2011_Event_CUSIA')
+    parser.add_argument('start', type=dt.datetime.fromisoformat,
+                        help='First time, YYYY-MM-DDTHH:MM:SS')
+    parser.add_argument('end', type=dt.datetime.fromisoformat,
+                        help='Last time, YYYY-MM-DDTHH:MM:SS')
+    parser.add_argument('--cadence', type=float, default=2.,
+                        help='Minutes between frames')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes')
+    parser.add_argument('--sat', type=float, default=1.5,
+                        help='Saturation point of Jr')
+    parser.add_argument('--lines', action='store_true',
+                        help='Draw contour lines')
+    parser.add_argument('--dpi', type=int, default=300,
+                        help='Resolution of the PNGs and video frames; a '
+                             'frame is 12x9 inches, about 29 MB in memory '
+                             'at 300 dpi (use 100-150 dpi for videos)')
+    parser.add_argument('--ampere-root', default=AMPERE_ROOT,
+                        help='Folder of AMPERE events')
+    parser.add_argument('--swmf-root', default=SWMF_ROOT,
+                        help='Folder of SWMF events')
+    parser.add_argument('--plot-root', default=PLOT_ROOT,
+                        help='Folder of plots')
+    parser.add_argument('--cache-dir', default=None,
+                        help='AMPERE cache directory')
+    parser.add_argument('--video', default=None,
+                        help='Video file to stream the frames to')
+    parser.add_argument('--no-png', dest='png', action='store_false',
+                        help='Do not save PNGs (with --video)')
+    parser.add_argument('--fps', type=float, default=10.,
+                        help='Frames per second of the video')
+    parser.add_argument('--codec', default='MJPG',
+                        help='FourCC code of the video codec')
+    parser.add_argument('--max-buffer', type=float, default=512.,
+                        help='Largest size (MB) of the video frames in '
+                             'flight')
+    args = parser.parse_args(args)
+    if not args.png and args.video is None:
+        parser.error('--no-png needs --video')
 
-# We loop around a start time and end_time
-t_start = dt.datetime(2011, 9, 26, 14, 8, 0)
-t_end = dt.datetime(2011, 9, 26, 14, 12, 0) #dt.datetime(2011, 9, 27, 9, 58, 0)
+    done, skipped = render(args.event, args.start, args.end,
+                           dt.timedelta(minutes=args.cadence), args.workers,
+                           args.sat, args.lines, args.dpi, args.ampere_root,
+                           args.swmf_root, args.plot_root, args.cache_dir,
+                           args.video, args.png, args.fps, args.codec,
+                           args.max_buffer, debug=True)
+    for time, reason in skipped:
+        print('Skipped {0}: {1}'.format(time, reason))
+    print('Rendered {0} frames'.format(len(done)))
 
-t_date = t_start
 
-while(t_date <= t_end):
-    t = t_date.timetuple() # Stripped the numbers into a timetuple
-    swmf_fname = (('./SWMF-MAGNIT/Sept2011_Event_CUSIA/' +
-                   'it{0}{1:0=2d}{2:0=2d}_{3:0=2d}{4:0=2d}{5:0=2d}_000.idl')
-                  .format(str(t[0])[2:4], t[1], t[2], t[3], t[4], t[5]))
-    
-    fac_plot(northfile, southfile, swmf_fname, 1.5, t)#, lines=True)
-    t_date = t_date + dt.timedelta(minutes=2)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fac_metrics.py
+--------------
+
+This module scores SWMF field-aligned currents against AMPERE: for each
+hemisphere and each time, the correlation, RMSE and bias of Jr, the overlap
+of the upward and downward current patterns, and the ratio of integrated
+FACs (iFACs). No figure is drawn.
+
+SWMF Jr is interpolated onto the AMPERE grid (see regrid) and compared at
+AMPERE record times. Statistics are weighted by grid cell area (see
+ifacs.ampere_weights), over the points where both maps have data; the
+AMPERE ghost column is left out. Times are processed in chunks of SWMF
+files, each one a batch of array operations, and rows are appended to a CSV
+table as they are computed.
+
+Usage:
+
+    python fac_metrics.py Sept2011_Event_CUSIA metrics.csv
+"""
+
+import numpy as np # Numerical Python
+import datetime as dt # Library to work with dates and times
+import os # Files and directories
+import csv # Metrics table
+import argparse # Command line interface
+import ampere_read # AMPERE File Reader
+import swmf_read # SWMF IE File Reader
+import ifacs # Integrated FACs Calculator
+import regrid # AMPERE/SWMF regridding
+
+# Default data folders; one subfolder per event
+AMPERE_ROOT = './AMPERE/'
+SWMF_ROOT = './SWMF-MAGNIT/'
+
+METRICS = ('corr', 'rmse', 'bias', 'up_overlap', 'down_overlap',
+           'ifac_model', 'ifac_obs', 'ifac_ratio')
+
+
+def skill(model, obs, weights, threshold=0.2):
+    """
+    This function compares two stacks of maps on the same grid, all times
+    at once.
+
+    Input:
+    ------
+        model     Model Jr, (time, ...) array; NaN where not available
+        obs       Observed Jr, same shape; NaN where not available
+        weights   Weights of the grid points (e.g. cell areas)
+        threshold Jr (muA/m^2) above which a current is upward, and below
+                  minus which it is downward
+
+    Output:
+    -------
+        dict    Time series 'corr' (Pearson correlation), 'rmse', 'bias'
+                (model - obs), and 'up_overlap' and 'down_overlap': area of
+                the intersection over area of the union of the upward
+                (downward) current regions of both maps. NaN where
+                undefined.
+
+    """
+
+    axes = tuple(range(1, model.ndim))
+    ok = np.isfinite(model) & np.isfinite(obs)
+    w = np.where(ok, weights, 0.)
+    m = np.where(ok, model, 0.)
+    o = np.where(ok, obs, 0.)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = w.sum(axis=axes)
+        m_mean = (w * m).sum(axis=axes) / total
+        o_mean = (w * o).sum(axis=axes) / total
+        shape = (-1,) + (1,) * len(axes)
+        dm = np.where(ok, m - m_mean.reshape(shape), 0.)
+        do = np.where(ok, o - o_mean.reshape(shape), 0.)
+
+        scores = {}
+        scores['corr'] = ((w * dm * do).sum(axis=axes) /
+                          np.sqrt((w * dm**2).sum(axis=axes) *
+                                  (w * do**2).sum(axis=axes)))
+        scores['rmse'] = np.sqrt((w * (m - o)**2).sum(axis=axes) / total)
+        scores['bias'] = m_mean - o_mean
+
+        for name, m_in, o_in in (('up', m > threshold, o > threshold),
+                                 ('down', m < -threshold, o < -threshold)):
+            scores[name + '_overlap'] = ((w * (m_in & o_in)).sum(axis=axes) /
+                                         (w * (m_in | o_in)).sum(axis=axes))
+
+    return scores
+
+
+def _records(times, record_times, tolerance):
+    """
+    Nearest record (index) of each time, and whether it is within tolerance
+    (seconds).
+    """
+
+    t = times.astype('datetime64[s]').astype('i8')
+    rec = record_times.astype('datetime64[s]').astype('i8')
+    i = np.clip(np.searchsorted(rec, t), 0, len(rec) - 1)
+    before = np.maximum(i - 1, 0)
+    i = np.where(np.abs(rec[before] - t) <= np.abs(rec[i] - t), before, i)
+    return i, np.abs(rec[i] - t) <= tolerance
+
+
+def score_stack(stack, ampere, tolerance=0, threshold=0.2):
+    """
+    This function scores a time stack of SWMF IE data (see
+    swmf_read.read_ie_stack) against AMPERE.
+
+    Input:
+    ------
+        stack      SWMF IE stack, read with swmf_read.FAC_VARIABLES
+        ampere     Dictionary of open AmpereFile objects keyed by hemisphere
+        tolerance  Largest time (seconds) between an SWMF output and the
+                   AMPERE record it is compared with; other times are
+                   left out
+        threshold  See skill
+
+    Output:
+    -------
+        dict    'time' and, per hemisphere, one time series per metric:
+                'n_corr', 'n_rmse', ..., 's_ifac_ratio' (see METRICS).
+
+    """
+
+    swmf = swmf_read.stack_plottable(stack)
+    model_ifac = ifacs.calc_I_stack(stack)
+
+    amp = ampere['north']
+    i, found = _records(swmf['time'], amp.time, tolerance)
+    i = i[found]
+
+    scores = {'time': swmf['time'][found]}
+    for hemi in ('north', 'south'):
+        h = hemi[0]
+        amp = ampere[hemi]
+        if not np.array_equal(amp.time, ampere['north'].time):
+            raise ValueError('Records of {0} do not match the other '
+                             'hemisphere'.format(amp.fname))
+
+        grid = amp[0] # Plottable Lat (deg from pole) and MLT (rad)
+        Lat, MLT = regrid.ampere_colat(grid, hemi), grid['MLT']
+        model = regrid.regrid(swmf[h + '_Jr'][found], swmf[h + '_Lat'],
+                              swmf[h + '_MLT'], Lat, MLT)[:, :, :-1]
+        obs = np.asarray(amp.jr[i])[:, :, :-1]
+        raw_Lat, raw_MLT = amp.grids(0)[:2]
+        weights = ifacs.ampere_weights(raw_Lat[:, :-1], raw_MLT[:, :-1])
+
+        for name, value in skill(model, obs, weights, threshold).items():
+            scores[h + '_' + name] = value
+
+        scores[h + '_ifac_model'] = model_ifac[h + '_Itotal'][found]
+        scores[h + '_ifac_obs'] = ifacs.integrate_jr(obs, weights)[3]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores[h + '_ifac_ratio'] = (scores[h + '_ifac_model'] /
+                                         scores[h + '_ifac_obs'])
+
+    return scores
+
+
+def columns():
+    """
+    Column names of the metrics table.
+    """
+
+    return ['time'] + [h + '_' + name for h in ('n', 's') for name in METRICS]
+
+
+def score_event(ampere_dir, swmf_dir, out=None, t_start=None, t_end=None,
+                tolerance=0, threshold=0.2, chunk=240, max_workers=None,
+                cache_dir=None, debug=False):
+    """
+    This function scores the SWMF IE output of an event directory against
+    the AMPERE files of the event, chunk files at a time, and appends the
+    rows of each chunk to a CSV table as soon as they are computed.
+
+    Input:
+    ------
+        ampere_dir  AMPERE event directory
+        swmf_dir    SWMF IE event directory
+        out         Optional CSV filename (overwritten)
+        t_start     Optional first time (datetime)
+        t_end       Optional last time (datetime)
+        tolerance   See score_stack (seconds)
+        threshold   See skill
+        chunk       Number of SWMF files per chunk
+        max_workers Number of worker processes reading SWMF files
+        cache_dir   Optional AMPERE cache directory (see AmpereFile)
+
+    Output:
+    -------
+        dict    The whole table, one array per column (see columns).
+
+    """
+
+    fnames = swmf_read.ie_files(swmf_dir, t_start, t_end)
+    names = columns()
+    tables = []
+    ampere = {}
+    files = None # AMPERE files of the previous time; one per day
+
+    f = open(out, 'w', newline='') if out is not None else None
+    try:
+        if f is not None:
+            writer = csv.writer(f)
+            writer.writerow(names)
+
+        for k in range(0, len(fnames), chunk):
+            stack = swmf_read.read_ie_stack(fnames[k:k+chunk],
+                                            swmf_read.FAC_VARIABLES,
+                                            max_workers=max_workers)
+
+            # One group per set of AMPERE files (e.g. one per day)
+            groups = {}
+            for j, t in enumerate(stack['time'].astype(dt.datetime)):
+                if files is None or not _covers(files, t):
+                    try:
+                        files = ampere_read.ampere_files(ampere_dir, t)
+                    except ampere_read.NoRecordError:
+                        files = None
+                        continue # No AMPERE data
+                groups.setdefault(tuple(sorted(files.items())), []).append(j)
+
+            for key, sel in groups.items():
+                for hemi, fname in key:
+                    if fname not in ampere:
+                        ampere[fname] = ampere_read.AmpereFile(
+                            fname, cache_dir=cache_dir, hemi=hemi)
+                table = score_stack(_take(stack, sel),
+                                    {hemi: ampere[fname]
+                                     for hemi, fname in key},
+                                    tolerance, threshold)
+                tables.append(table)
+
+                if f is not None:
+                    times = table['time'].astype('datetime64[s]').astype(str)
+                    writer.writerows(zip(times, *[table[name]
+                                                  for name in names[1:]]))
+                    f.flush()
+                if debug and len(table['time']): print(table['time'][-1])
+    finally:
+        if f is not None:
+            f.close()
+        for amp in ampere.values():
+            amp.close()
+
+    if not tables:
+        return {name: np.array([]) for name in names}
+    return {name: np.concatenate([table[name] for table in tables])
+            for name in names}
+
+
+def _covers(files, t):
+    """
+    Whether AMPERE files (see ampere_read.ampere_files) all cover a time,
+    from their names; the directory is not listed again.
+    """
+
+    for fname in files.values():
+        info = ampere_read.parse_fname(fname)
+        if not info['start'] <= t < info['start'] + info['duration']:
+            return False
+    return True
+
+
+def _take(stack, sel):
+    """
+    Some of the times of an IE stack; the shared grid is kept as is.
+    """
+
+    part = swmf_read.IeData()
+    part.attrs = stack.attrs
+    part.dlat, part.dlon = stack.dlat, stack.dlon
+    for key, value in stack.items():
+        if key == 'time' or (np.ndim(value) == 3 and
+                             len(value) == len(stack['time'])):
+            part[key] = value[sel]
+        else:
+            part[key] = value
+    return part
+
+
+#=============================================================================
+
+# MAIN FUNCTION:
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Skill metrics of SWMF FACs against AMPERE.')
+    parser.add_argument('event', help='Event name, e.g. Sept2011_Event_CUSIA')
+    parser.add_argument('out', help='CSV table to write')
+    parser.add_argument('--start', type=dt.datetime.fromisoformat,
+                        help='First time, YYYY-MM-DDTHH:MM:SS')
+    parser.add_argument('--end', type=dt.datetime.fromisoformat,
+                        help='Last time, YYYY-MM-DDTHH:MM:SS')
+    parser.add_argument('--tolerance', type=float, default=0.,
+                        help='Largest SWMF to AMPERE time difference (s)')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Jr of up/down current regions (muA/m^2)')
+    parser.add_argument('--chunk', type=int, default=240,
+                        help='SWMF files per chunk')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes')
+    parser.add_argument('--ampere-root', default=AMPERE_ROOT,
+                        help='Folder of AMPERE events')
+    parser.add_argument('--swmf-root', default=SWMF_ROOT,
+                        help='Folder of SWMF events')
+    parser.add_argument('--cache-dir', default=None,
+                        help='AMPERE cache directory')
+    args = parser.parse_args(args)
+
+    table = score_event(os.path.join(args.ampere_root, args.event),
+                        os.path.join(args.swmf_root, args.event), args.out,
+                        args.start, args.end, args.tolerance, args.threshold,
+                        args.chunk, args.workers, args.cache_dir, debug=True)
+    print('Scored {0} times'.format(len(table['time'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,18 @@
 Video Maker
 ===========
 This program takes in all your image files and makes a video out of it.
+Frames rendered in memory (RGB arrays, e.g. FacFigure.rgb) can also be
+written directly with open_writer and write_rgb, without PNGs on disk.
+
+Images are decoded on a pool of background threads while the video is
+encoded, with a bounded number of decoded frames waiting at any time, so
+memory use does not grow with the length of the sequence. Frames are
+ordered by the time in their names (YYYYMMDD_HHMMSS, see
+fac_compare.frame_fname).
+
+Usage:
+
+    python fac_video.py './Plots/Sept2011_Event_CUSIA/*.png' video.avi
 
 Created on Thu Oct  1 17:02:25 2020
 
@@ -11,21 +23,169 @@ Created on Thu Oct  1 17:02:25 2020
 """
 import cv2
 import os
+import re # Frame times
+import glob # Frame filenames
+import argparse # Command line interface
+import collections # Frames in flight
+import datetime as dt # Library to work with dates and times
+from concurrent.futures import ThreadPoolExecutor # Background decoding
+
+# Frame times in filenames: YYYYMMDD_HHMMSS
+_FRAME_TIME = re.compile(r'(\d{8})_(\d{6})')
+
+
+def frame_time(fname):
+    """
+    Time of a frame, from its name (None if it has no YYYYMMDD_HHMMSS).
+    """
+
+    match = _FRAME_TIME.search(os.path.basename(fname))
+    if match is None:
+        return None
+    try:
+        return dt.datetime.strptime(match.group(1) + match.group(2),
+                                    '%Y%m%d%H%M%S')
+    except ValueError:
+        return None
+
+
+def frame_files(pattern):
+    """
+    Image files matching a glob pattern, in time order. Files without a
+    time in their name are left out.
+    """
+
+    frames = [(frame_time(fname), fname) for fname in glob.glob(pattern)]
+    return [fname for t, fname in sorted(frame for frame in frames
+                                         if frame[0] is not None)]
+
+
+def open_writer(fname, size, fps=10, fourcc=0):
+    """
+    Open a video writer for frames of size (width, height). fourcc is a
+    FourCC code (e.g. 'MJPG') or 0 for uncompressed frames.
+    """
+
+    if isinstance(fourcc, str):
+        fourcc = cv2.VideoWriter_fourcc(*fourcc)
+    video = cv2.VideoWriter(fname, fourcc, fps, size)
+    if not video.isOpened():
+        raise ValueError('Cannot write video {0}'.format(fname))
+    return video
+
+
+def write_rgb(video, rgb):
+    """
+    Write an RGB frame (height, width, 3 array) to a video writer.
+    """
+
+    video.write(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+
+
+def _decode(fname):
+    frame = cv2.imread(fname)
+    if frame is None:
+        raise ValueError('Cannot read image {0}'.format(fname))
+    return frame
+
+
+def make_video(images, video_name, fps=10, codec='MJPG', max_workers=4,
+               queue_size=16, resize=False, debug=False):
+    """
+    This function makes a video out of a sequence of images. Images are
+    decoded on max_workers background threads, at most queue_size frames
+    ahead of the writer.
+
+    The first image sets the size of the video. Video writers drop frames
+    of any other size without a word, so a frame of a different size raises
+    ValueError, or is resized with resize.
+
+    Input:
+    ------
+        images      Glob pattern of the images (ordered by the time in
+                    their names, see frame_files), or a list of filenames
+                    in video order
+        video_name  Video filename
+        fps         Frames per second
+        codec       FourCC code of the codec (e.g. 'MJPG', 'mp4v', 'XVID'),
+                    or 0 for uncompressed frames
+        max_workers Number of decoding threads
+        queue_size  Maximum number of decoded frames waiting to be written
+        resize      Resize frames of a different size instead of raising
+
+    Output:
+    -------
+        int     Number of frames written.
+
+    """
+
+    if isinstance(images, str):
+        images = frame_files(images)
+    if len(images) == 0:
+        raise ValueError('No images to make a video of')
+
+    height, width = _decode(images[0]).shape[:2]
+    video = open_writer(video_name, (width, height), fps, codec)
+
+    def write(fname, frame):
+        if frame.shape[:2] != (height, width):
+            if not resize:
+                raise ValueError('{0} is {1}x{2}, not {3}x{4}'
+                                 .format(fname, frame.shape[1],
+                                         frame.shape[0], width, height))
+            frame = cv2.resize(frame, (width, height),
+                               interpolation=cv2.INTER_AREA)
+        video.write(frame)
+        if debug: print(fname)
+
+    pending = collections.deque()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for fname in images:
+                pending.append((fname, pool.submit(_decode, fname)))
+                if len(pending) >= queue_size:
+                    fname, frame = pending.popleft()
+                    write(fname, frame.result())
+            while pending:
+                fname, frame = pending.popleft()
+                write(fname, frame.result())
+    finally:
+        for fname, frame in pending:
+            frame.cancel()
+        video.release()
+
+    return len(images)
+
 
-image_folder = './Plots/Sept2011_Event_CUSIA/'
-video_name = './Plots/Sept2011_Event_CUSIA/video.avi'
+#=============================================================================
 
-images = [img for img in os.listdir(image_folder) if img.endswith(".png")]
-images.sort()
+# MAIN FUNCTION:
 
-frame = cv2.imread(os.path.join(image_folder, images[0]))
-height, width, layers = frame.shape
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Make a video out of a sequence of images.')
+    parser.add_argument('images',
+                        help="Glob pattern of the images, e.g. "
+                             "'./Plots/Sept2011_Event_CUSIA/*.png'")
+    parser.add_argument('video', help='Video filename')
+    parser.add_argument('--fps', type=float, default=10.,
+                        help='Frames per second')
+    parser.add_argument('--codec', default='MJPG',
+                        help="FourCC code of the codec, or 0 for "
+                             "uncompressed frames")
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Decoding threads')
+    parser.add_argument('--queue', type=int, default=16,
+                        help='Maximum decoded frames waiting')
+    parser.add_argument('--resize', action='store_true',
+                        help='Resize frames of a different size')
+    args = parser.parse_args(args)
 
-video = cv2.VideoWriter(video_name, 0, 10, (width,height))
+    codec = 0 if args.codec == '0' else args.codec
+    n = make_video(args.images, args.video, args.fps, codec, args.workers,
+                   args.queue, args.resize, debug=True)
+    print('Wrote {0} frames'.format(n))
 
-for image in images:
-    video.write(cv2.imread(os.path.join(image_folder, image)))
-    print(image)
 
-cv2.destroyAllWindows()
-video.release()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ie_batch.py
+-----------
+
+This module computes hemispheric power (calc_hpi) and integrated FAC (ifacs)
+diagnostics over a directory of SWMF IE files, incrementally. Results are
+appended batch by batch to a results directory, together with a manifest of
+the inputs already processed, so an interrupted job resumes where it stopped
+and a rerun on a still-running simulation only reads the new (or changed)
+files.
+
+Results directory layout:
+
+    manifest.json       Processed inputs: path -> size, mtime and chunk
+    chunk_00000.npz     Columnar results of one batch of input files
+    chunk_00001.npz     ...
+
+Usage:
+
+    python ie_batch.py ./SWMF-MAGNIT/Sept2011_Event_CUSIA/ ./Results/Sept2011/
+"""
+
+import numpy as np # Numerical Python
+import datetime as dt # Library to work with dates and times
+import os # Files and directories
+import re # Chunk filenames
+import json # Manifest
+import argparse # Command line interface
+import swmf_read # SWMF IE File Reader
+import calc_hpi # Hemispheric Power Calculator
+import ifacs # Integrated FACs Calculator
+
+_CHUNK = re.compile(r'chunk_(\d{5})\.npz$')
+
+
+def _stamp(fname):
+    """
+    Size and modification time of an input file.
+    """
+
+    stat = os.stat(fname)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _chunks(outdir):
+    """
+    Chunk numbers and filenames of a results directory, in order.
+    """
+
+    chunks = []
+    for fname in os.listdir(outdir):
+        match = _CHUNK.match(fname)
+        if match is not None:
+            chunks.append((int(match.group(1)), os.path.join(outdir, fname)))
+    return sorted(chunks)
+
+
+def _load_manifest(outdir):
+    """
+    Manifest of processed inputs (empty for a new results directory).
+    """
+
+    try:
+        with open(os.path.join(outdir, 'manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(outdir, manifest):
+    """
+    Write the manifest aside and move it into place.
+    """
+
+    tmp = os.path.join(outdir, 'manifest.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(outdir, 'manifest.json'))
+
+
+def diagnostics(stack):
+    """
+    HPI, number flux and iFAC time series of an IE time stack, read with
+    calc_hpi.HPI_VARIABLES, as one columnar table.
+    """
+
+    table = calc_hpi.calc_hpi_stack(stack)
+    table.update(ifacs.calc_I_stack(stack))
+    return table
+
+
+def run(dirname, outdir, t_start=None, t_end=None, chunk=240,
+        max_workers=None, debug=False):
+    """
+    This function brings the diagnostics of an SWMF IE directory up to date.
+    Inputs that are new, or whose size or modification time changed since
+    they were processed, are read (see swmf_read.read_ie_stack) in batches of
+    chunk files; the results of each batch are written as a new chunk and
+    recorded in the manifest before the next batch starts. Files that cannot
+    be read (e.g. still being written) are left out of the results and the
+    manifest, so they are read again on the next run.
+
+    Input:
+    ------
+        dirname     Directory with SWMF IE output
+        outdir      Results directory (created if needed)
+        t_start     Optional first time (datetime) to include
+        t_end       Optional last time (datetime) to include
+        chunk       Number of input files per batch / checkpoint
+        max_workers Number of worker processes reading files
+
+    Output:
+    -------
+        int     Number of input files processed (read).
+
+    """
+
+    os.makedirs(outdir, exist_ok=True)
+    manifest = _load_manifest(outdir)
+
+    todo = []
+    for fname in swmf_read.ie_files(dirname, t_start, t_end):
+        path = os.path.abspath(fname)
+        stamp = _stamp(path)
+        entry = manifest.get(path)
+        if entry is None or entry['size'] != stamp['size'] or \
+                entry['mtime_ns'] != stamp['mtime_ns']:
+            todo.append((path, stamp))
+
+    if debug: print('{0} new or changed inputs'.format(len(todo)))
+
+    chunks = _chunks(outdir)
+    n_chunk = chunks[-1][0] + 1 if chunks else 0
+    n_read = 0
+
+    for i in range(0, len(todo), chunk):
+        batch = todo[i:i+chunk]
+        paths = [path for path, stamp in batch]
+
+        stack = swmf_read.read_ie_stack(paths, calc_hpi.HPI_VARIABLES,
+                                        max_workers=max_workers,
+                                        skip_invalid=True)
+        if stack is None:
+            if debug: print('Skipped {0} unreadable inputs'.format(len(paths)))
+            continue
+        if debug:
+            for path in stack.attrs['skipped']: print('Skipped ' + path)
+        read = set(stack.attrs['files'])
+        table = diagnostics(stack)
+        table['fname'] = np.array(stack.attrs['files'])
+
+        # Checkpoint: results first, then the manifest
+        fname = os.path.join(outdir, 'chunk_{0:05d}.npz'.format(n_chunk))
+        tmp = fname[:-4] + '.tmp.npz'
+        np.savez(tmp, **table)
+        os.replace(tmp, fname)
+
+        for path, stamp in batch:
+            if path in read:
+                manifest[path] = dict(stamp, chunk=n_chunk)
+        _write_manifest(outdir, manifest)
+
+        if debug: print(fname, len(read))
+        n_chunk += 1
+        n_read += len(read)
+
+    return n_read
+
+
+def load_results(outdir):
+    """
+    This function loads the results of a results directory as one columnar
+    table, sorted by time. An input processed more than once (because it
+    changed, or because a job stopped between writing a chunk and the
+    manifest) contributes its latest row only.
+
+    Output:
+    -------
+        dict    'time', 'fname' and one array per diagnostic (see
+                calc_hpi.calc_hpi_stack and ifacs.calc_I_stack).
+
+    """
+
+    tables = []
+    for n_chunk, fname in _chunks(outdir):
+        with np.load(fname) as chunk:
+            tables.append({key: chunk[key] for key in chunk.files})
+    if not tables:
+        return {}
+
+    table = {key: np.concatenate([t[key] for t in tables])
+             for key in tables[0]}
+
+    # Latest row of each input: last occurrence in chunk order
+    files = table['fname'][::-1]
+    keep = len(files) - 1 - np.unique(files, return_index=True)[1]
+    keep = keep[np.argsort(table['time'][keep], kind='stable')]
+
+    return {key: value[keep] for key, value in table.items()}
+
+
+#=============================================================================
+
+# MAIN FUNCTION:
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Incremental HPI and iFAC diagnostics of SWMF IE output.')
+    parser.add_argument('dirname', help='Directory with SWMF IE output')
+    parser.add_argument('outdir', help='Results directory')
+    parser.add_argument('--start', type=dt.datetime.fromisoformat,
+                        help='First time, YYYY-MM-DDTHH:MM:SS')
+    parser.add_argument('--end', type=dt.datetime.fromisoformat,
+                        help='Last time, YYYY-MM-DDTHH:MM:SS')
+    parser.add_argument('--chunk', type=int, default=240,
+                        help='Input files per checkpoint')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes')
+    args = parser.parse_args(args)
+
+    n = run(args.dirname, args.outdir, args.start, args.end, args.chunk,
+            args.workers, debug=True)
+    print('Processed {0} files'.format(n))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,89 +7,201 @@ Created on Thu Oct  1 15:24:04 2020
 """
 
 import numpy as np # Numerical Python
-from spacepy.pybats import rim # To read in SWMF files
+import swmf_read # To read in SWMF files
 import ampere_read as amprd
 import datetime as dt
+import hashlib # Grid geometry keys
+import os # File stamps of cached series
 
-def calc_I_swmf(fname):
+# Calculate some physically meaningful values/units
+UNITS = 1E-6*1E-6  # micro amps to amps, amps to MegaAmps
+R = (6371.0+110.0)*1000.0 # Radius of Earth + iono altitude
+
+_WEIGHTS = {} # Area weights, cached per grid geometry
+
+
+def area_weights(theta, dlat, dlon):
+    """
+    Area element sin(colat)*dTheta*dPhi of a grid, with colatitude theta and
+    spacings dlat, dlon in degrees. Computed once per grid geometry and 
+    cached; the returned array is shared, do not modify it.
+    """
+
+    theta = np.ascontiguousarray(theta, dtype=float)
+    key = (theta.shape, float(dlat), float(dlon), 
+           hashlib.sha1(theta.tobytes()).hexdigest())
+    if key not in _WEIGHTS:
+        dTheta = np.pi*dlat/180.
+        dPhi   = np.pi*dlon/180.
+        weights = np.sin(theta*np.pi/180.)*dTheta*dPhi
+        weights.setflags(write=False)
+        _WEIGHTS[key] = weights
+    return _WEIGHTS[key]
+
+
+def integrate_jr(jr, weights):
+    """
+    Integrate radial current over one hemisphere. jr may hold any number of
+    leading (time) axes in front of the grid axes; the results have the 
+    leading shape.
+    
+    Returns I, Iup, Idown and Itotal (= half of the absolute current) in MA.
+    """
+
+    scale = UNITS*R**2
+    I      = scale * np.einsum('...ij,ij->...', jr, weights)
+    Iup    = scale * np.einsum('...ij,ij->...', np.maximum(jr, 0.), weights)
+    Idown  = scale * np.einsum('...ij,ij->...', np.minimum(jr, 0.), weights)
+    Itotal = 0.5 * (np.abs(Iup) + np.abs(Idown))
+    return I, Iup, Idown, Itotal
+
+
+def calc_I_stack(data):
+    """
+    Integrate radial current over both hemispheres of SWMF IE data, e.g. a
+    time stack from swmf_read.read_ie_stack or a single file from 
+    swmf_read.read_ie. The area weights of the grid are cached, so repeated
+    calls on the same grid only do the sums.
+    
+    Returns a dictionary of I, Iup, Idown and Itotal (MA) per hemisphere 
+    ('n_I', 's_Itotal', ...), as time series for a stack, and 'time' when 
+    the data has it.
+    """
+
+    ifac = {}
+    if 'time' in data:
+        ifac['time'] = data['time']
+
+    for h in ('n', 's'):
+        weights = area_weights(data[h+'_theta'], data.dlat, data.dlon)
+        (ifac[h+'_I'], ifac[h+'_Iup'], ifac[h+'_Idown'], 
+         ifac[h+'_Itotal']) = integrate_jr(data[h+'_jr'], weights)
+
+    return ifac
+
+
+def calc_I_swmf(fname, cache=None):
     """
         See string for calc_I in SpacePy's pybats.rim
+
+        fname may also be data already read with swmf_read.read_ie, and 
+        cache a parse cache shared with swmf_read (see swmf_read.load_ie).
     """
    
     # Read the IE data file
-    data = rim.Iono(fname)
-    data['time'] = data.attrs['time']
-   
-    # Compute dLon and dLat
-    data.dlon = data['n_psi'  ][0,3] - data['n_psi'  ][0,2]
-    data.dlat = data['n_theta'][3,0] - data['n_theta'][2,0]
-   
-    # Calculate some physically meaningful values/units
-    units = 1E-6*1E-6  # micro amps to amps, amps to MegaAmps
-    R = (6371.0+110.0)*1000.0 # Radius of Earth + iono altitude
-    dTheta = np.pi*data.dlat/180.
-    dPhi   = np.pi*data.dlon/180.
-   
-    # -----NORTHERN HEMISPHERE-----
-    # Get relevant values:
-    colat     = data['n_theta']*np.pi/180.
-    integrand = data['n_jr']*np.sin(colat)*dTheta*dPhi
-    # Get locations of "up" and "down"
-    loc_up = data['n_jr']>0
-    loc_do = data['n_jr']<0
-    data['n_I']     = units*R**2 * np.sum(integrand)
-    data['n_Iup']   = units*R**2 * np.sum(integrand[loc_up])
-    data['n_Idown'] = units*R**2 * np.sum(integrand[loc_do])
-    data['n_Itotal']= units*R**2 * np.sum(np.abs(integrand)) * 0.5
-   
-    # -----SOUTHERN HEMISPHERE-----
-    # Get relevant values:
-    colat     = data['s_theta']*np.pi/180.
-    integrand = data['s_jr']*np.sin(colat)*dTheta*dPhi
-    # Get locations of "up" and "down"
-    loc_up = data['s_jr']>0
-    loc_do = data['s_jr']<0
-    data['s_I']     = units*R**2 * np.sum(integrand)
-    data['s_Iup']   = units*R**2 * np.sum(integrand[loc_up])
-    data['s_Idown'] = units*R**2 * np.sum(integrand[loc_do])
-    data['s_Itotal']= units*R**2 * np.sum(np.abs(integrand)) * 0.5
-
-    return data['n_Itotal'], data['s_Itotal']
-
-def calc_I_ampere(fname, time):
+    data = swmf_read.load_ie(fname, swmf_read.FAC_VARIABLES, cache)
+    ifac = calc_I_stack(data)
+
+    return ifac['n_Itotal'], ifac['s_Itotal']
+
+
+def ampere_weights(Lat, MLT):
+    """
+    Area weights of an AMPERE grid from the raw Lat and MLT grids of 
+    AmpereFile (ghost cell excluded). The colatitude is the one stored in the
+    file (91 - Lat) and the MLT spacing is converted from hours to degrees.
+    """
+
+    colat = 91. - Lat
+    dlat = np.abs(colat[1,0] - colat[0,0])
+    dlon = (MLT[0,1] - MLT[0,0]) * 15.
+    return area_weights(colat, dlat, dlon)
+
+
+def calc_I_ampere(fname, time, cache_dir=None):
     """
         See string for calc_I in SpacePy's pybats.rim
+
+        Integrates one AMPERE record on the grid stored in the file; the 
+        ghost cell is not counted. Returns the ampere_read dictionary with
+        'I', 'Iup', 'Idown' and 'Itotal' (MA) added.
     """
    
-    # Read the IE data file
-    data = amprd.ampere_read(fname, time)
+    # Read the AMPERE data file
+    with amprd.AmpereFile(fname, cache_dir=cache_dir) as amp:
+        Lat, MLT, Jr = amp.grids(amp.index(time))
+        data = amprd._plottable(Lat, MLT, Jr, amp.hemi)
     data['time'] = time
-   
-    # Compute dLon and dLat
-    dlon = data['MLT'  ][0,3] - data['MLT'  ][0,2]
-    dlat = data['Lat'][3,0] - data['Lat'][2,0]
-   
-    # Calculate some physically meaningful values/units
-    units = 1E-6*1E-6  # micro amps to amps, amps to MegaAmps
-    R = (6371.0+110.0)*1000.0 # Radius of Earth + iono altitude
-    dTheta = np.pi*dlat/180.
-    dPhi   = np.pi*dlon/180.
-   
-    # -----NORTHERN HEMISPHERE-----
-    # Get relevant values:
-    colat     = data['Lat']*np.pi/180.
-    integrand = data['Jr']*np.sin(colat)*dTheta*dPhi
-    # Get locations of "up" and "down"
-    loc_up = data['Jr']>0
-    loc_do = data['Jr']<0
-    data['I']     = units*R**2 * np.sum(integrand)
-    data['Iup']   = units*R**2 * np.sum(integrand[loc_up])
-    data['Idown'] = units*R**2 * np.sum(integrand[loc_do])
-    
-    print(data['Iup'])
+
+    weights = ampere_weights(Lat[:, :-1], MLT[:, :-1])
+    data['I'], data['Iup'], data['Idown'], data['Itotal'] = integrate_jr(
+        Jr[:, :-1], weights)
     
     return data
 
+
+def calc_I_ampere_series(files, cache_dir=None, ampere=None):
+    """
+    Integrate radial current over every record of AMPERE files, in one 
+    vectorized pass per file (the whole-file Jr cube is read once).
+    
+    Input:
+    ------
+        files     Dictionary of AMPERE filenames keyed by hemisphere, e.g. 
+                  from ampere_read.ampere_files
+        cache_dir Optional AMPERE cache directory (see ampere_read.AmpereFile)
+        ampere    Optional dictionary of open AmpereFile objects keyed by
+                  filename; files found in it are not opened again
+    
+    Output:
+    -------
+        dict    'time' (datetime64) and I, Iup, Idown and Itotal time series
+                (MA) per hemisphere: 'n_I', 's_Itotal', ...
+            
+    """
+
+    if ampere is None: ampere = {}
+    ifac = {}
+    for hemi, fname in files.items():
+        amp = ampere.get(fname)
+        if amp is None:
+            amp = amprd.AmpereFile(fname, cache_dir=cache_dir, hemi=hemi)
+        try:
+            Lat, MLT, Jr = amp.grids(0)
+            weights = ampere_weights(Lat[:, :-1], MLT[:, :-1])
+            h = hemi[0]
+            (ifac[h+'_I'], ifac[h+'_Iup'], ifac[h+'_Idown'], 
+             ifac[h+'_Itotal']) = integrate_jr(amp.jr[:, :, :-1], weights)
+
+            if 'time' not in ifac:
+                ifac['time'] = amp.time
+            elif not np.array_equal(ifac['time'], amp.time):
+                raise ValueError('Records of {0} do not match the other '
+                                 'hemisphere'.format(fname))
+        finally:
+            if fname not in ampere:
+                amp.close()
+
+    return ifac
+
+
+_AMPERE_SERIES = {} # calc_I_ampere_series results, keyed by files
+
+
+def lookup_I_ampere(files, time, cache_dir=None, ampere=None):
+    """
+    Look up the total integrated current (Itotal, MA) of both hemispheres at
+    a record time. The full series of the files is computed on first use and
+    kept for the session (recomputed if a file changes); cache_dir and
+    ampere are passed to calc_I_ampere_series.
+    
+    Returns (n_Itotal, s_Itotal).
+    """
+
+    key = tuple(sorted((hemi, os.path.abspath(fname), 
+                        os.stat(fname).st_mtime_ns)
+                       for hemi, fname in files.items()))
+    if key not in _AMPERE_SERIES:
+        _AMPERE_SERIES[key] = calc_I_ampere_series(files, cache_dir, ampere)
+    ifac = _AMPERE_SERIES[key]
+
+    t_ind = np.searchsorted(ifac['time'], np.datetime64(time, 's'))
+    if (t_ind == len(ifac['time']) or 
+            ifac['time'][t_ind] != np.datetime64(time, 's')):
+        raise amprd.NoRecordError('{0} is not an AMPERE record time'
+                                  .format(time))
+    return ifac['n_Itotal'][t_ind], ifac['s_Itotal'][t_ind]
+
 # # AMPERE time start - This should be fixed in future renditions of this code!
 # tstart = dt.datetime(2011, 9, 26, 10, 0, 0) # Convert the numbers into a datetime
 # t = tstart.timetuple() # Stripped the numbers into a timetuple
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+kyoto_cache.py
+--------------
+
+This module serves Kyoto WDC auroral electrojet indices (AE, AU, AL and AO)
+from a local cache, so comparison runs do not go to the network every time
+and can run on nodes without network access.
+
+The cache holds one file per UT day (ae_YYYYMMDD.npz). Only days missing
+from the cache are fetched (with spacepy.pybats.kyoto), and only complete
+days are stored. In offline mode nothing is fetched: data come from the
+cache, or from an IAGA-2002 file downloaded from the Kyoto WDC beforehand.
+"""
+
+import numpy as np # Numerical Python
+import datetime as dt # Library to work with dates and times
+import os # Files and directories
+
+# Default cache directory
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.aurora_ops', 'kyoto')
+
+INDICES = ('ae', 'au', 'al', 'ao')
+
+MISSING = 99999. # Kyoto fill value
+
+
+def _day_fname(cache_dir, day):
+    return os.path.join(cache_dir, day.strftime('ae_%Y%m%d.npz'))
+
+
+def _days(time1, time2):
+    """
+    UT days from the day of time1 to the day of time2.
+    """
+
+    day = dt.datetime(time1.year, time1.month, time1.day)
+    days = []
+    while day <= time2:
+        days.append(day)
+        day += dt.timedelta(days=1)
+    return days
+
+
+def _store(cache_dir, data):
+    """
+    Split AE data into UT days and store the complete ones in the cache.
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+    day_of = data['time'].astype('datetime64[D]')
+    for day in np.unique(day_of):
+        sel = day_of == day
+        if np.count_nonzero(sel) < 1440:
+            continue # Partial day, e.g. today
+        fname = _day_fname(cache_dir, day.astype(dt.datetime))
+        tmp = '{0}.tmp{1}.npz'.format(fname[:-4], os.getpid())
+        try:
+            np.savez(tmp, **{key: data[key][sel] for key in data})
+            os.replace(tmp, fname)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def _from_kyoto(kyoto_ae):
+    """
+    Convert a spacepy KyotoAe object into arrays; fill values become NaN.
+    """
+
+    data = {'time': np.array(kyoto_ae['time'], dtype='datetime64[m]')}
+    for key in INDICES:
+        value = np.array(kyoto_ae[key], dtype=float)
+        value[value >= MISSING] = np.nan
+        data[key] = value
+    return data
+
+
+def read_iaga(fname):
+    """
+    Read Kyoto AE data from an IAGA-2002 file, e.g. downloaded from the
+    Kyoto WDC website.
+    """
+
+    import spacepy.pybats.kyoto as kyoto
+
+    with open(fname, 'r') as f:
+        lines = f.readlines()
+    return _from_kyoto(kyoto.KyotoAe(lines))
+
+
+def fetch_ae(time1, time2, cache_dir=CACHE_DIR, offline=False, fname=None,
+             debug=False):
+    """
+    This function returns Kyoto AE, AU, AL and AO between two times, from
+    the local cache where possible.
+
+    Input:
+    ------
+        time1     First time (datetime)
+        time2     Last time (datetime)
+        cache_dir Cache directory
+        offline   Never use the network: serve cached data only, and raise
+                  ValueError if some of the days requested are not cached
+        fname     Optional IAGA-2002 file to take data from; its complete
+                  days are added to the cache
+
+    Output:
+    -------
+        dict    'time' (datetime64 array) and 'ae', 'au', 'al', 'ao'
+                arrays, from time1 to time2. Missing values are NaN.
+
+    """
+
+    # Data not (or not yet) in the cache: a provided file, fetched ranges
+    extra = []
+    if fname is not None:
+        extra.append(read_iaga(fname))
+        _store(cache_dir, extra[-1])
+
+    days = _days(time1, time2)
+    covered = set()
+    for data in extra:
+        covered.update(np.unique(data['time'].astype('datetime64[D]'))
+                       .astype(dt.datetime))
+    missing = [day for day in days if day.date() not in covered and
+               not os.path.exists(_day_fname(cache_dir, day))]
+
+    if missing and offline:
+        raise ValueError('Kyoto AE not cached for {0} in {1} (offline)'
+                         .format(', '.join(day.strftime('%Y-%m-%d')
+                                           for day in missing), cache_dir))
+    elif missing:
+        import spacepy.pybats.kyoto as kyoto
+
+        # Fetch runs of consecutive missing days, one request per run
+        runs = [[missing[0]]]
+        for day in missing[1:]:
+            if day - runs[-1][-1] == dt.timedelta(days=1):
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+        for run in runs:
+            t_stop = run[-1] + dt.timedelta(hours=23, minutes=59)
+            if debug: print('Fetching Kyoto AE', run[0], t_stop)
+            extra.append(_from_kyoto(kyoto.fetch('ae', run[0], t_stop)))
+            _store(cache_dir, extra[-1])
+
+    parts = list(extra)
+    for day in days:
+        if day.date() not in covered and day not in missing:
+            with np.load(_day_fname(cache_dir, day)) as cached:
+                parts.append({key: cached[key] for key in cached.files})
+
+    ae = {key: np.concatenate([part[key] for part in parts])
+          for key in ('time',) + INDICES}
+    order = np.argsort(ae['time'], kind='stable')
+    ae = {key: value[order] for key, value in ae.items()}
+    # Drop times found in more than one part
+    keep = np.concatenate(([True], np.diff(ae['time']) > np.timedelta64(0)))
+    sel = keep & (ae['time'] >= np.datetime64(time1, 'm')) & \
+        (ae['time'] <= np.datetime64(time2, 'm'))
+
+    return {key: value[sel] for key, value in ae.items()}
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mag_read.py
+-----------
+
+This module reads in the magnetometer grid files (mag_grid_e*.out) written by
+SWMF (MAGNIT) and converts them into NumPy arrays to compute auroral indices.
+
+The files are SWMF ASCII output: a title line, a line with the time step,
+simulation time, number of dimensions, parameters and variables, a line with
+the grid size, an optional line of parameter values and a line of column
+names, followed by one line per grid point.
+
+A whole run directory can be packed into one compressed, chunked netCDF
+store (pack_run) holding dB as (time, station, component) plus the station
+coordinates, and read back by time range (MagStore).
+"""
+
+import numpy as np # Numerical Python
+import datetime as dt # Library to work with dates and times
+import os # Files and directories
+import re # Parsing filenames
+import zipfile # Corrupt index files
+import netCDF4 as ncdf # Compact mag_grid stores
+from concurrent.futures import ProcessPoolExecutor # Parallel packing
+
+
+class MagData(dict):
+    """
+    Contents of a mag_grid file: one 1D array per requested column, keyed by
+    column name ('Lon', 'Lat', 'dBn', ...), and the header in attrs.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(MagData, self).__init__(*args, **kwargs)
+        self.attrs = {}
+
+
+def _read_header(f):
+    """
+    Read the header of an SWMF ASCII file from an open file. Returns a
+    dictionary of header values.
+    """
+
+    header = {}
+    header['title'] = f.readline().strip()
+
+    line = f.readline().split()
+    header['step'] = int(line[0])
+    header['simtime'] = float(line[1])
+    header['ndim'] = abs(int(line[2])) # Negative for non-uniform grids
+    header['nparam'] = int(line[3])
+    header['nvar'] = int(line[4])
+
+    header['grid'] = [int(n) for n in f.readline().split()]
+    if header['nparam'] > 0:
+        header['params'] = [float(x) for x in f.readline().split()]
+    else:
+        header['params'] = []
+
+    names = f.readline().split()
+    header['names'] = names[:header['ndim'] + header['nvar']]
+    header['param_names'] = names[header['ndim'] + header['nvar']:]
+
+    return header
+
+
+def mag_grid_read(fname, columns=('dBn',)):
+    """
+    This function reads in a mag_grid file. Only the requested columns are
+    converted, with NumPy's compiled text parser, and the file is closed
+    when done.
+
+    Input:
+    ------
+        fname     mag_grid filename
+        columns   Column names (e.g. 'Lon', 'Lat', 'dBn', 'dBe') or 0-based
+                  column numbers to read; None reads all columns
+
+    Output:
+    -------
+        MagData Dictionary of 1D arrays keyed by column name, with the
+                header (title, step, simtime, ndim, grid, names, ...) in
+                attrs.
+
+    """
+
+    with open(fname, 'r') as f:
+        header = _read_header(f)
+        names = header['names']
+
+        if columns is None:
+            columns = names
+        cols = []
+        for col in columns:
+            if isinstance(col, str):
+                if col not in names:
+                    raise KeyError('{0} is not a column of {1}'
+                                   .format(col, fname))
+                col = names.index(col)
+            cols.append(col)
+
+        values = np.loadtxt(f, usecols=cols, ndmin=2)
+
+    data = MagData()
+    data.attrs = header
+    data.attrs['file'] = fname
+    data.attrs['time'] = mag_time(fname)
+    for i, col in enumerate(cols):
+        data[names[col]] = values[:, i]
+
+    return data
+
+
+# mag_grid filenames: mag_grid_e<YYYYMMDD>-<HHMMSS>.out
+_MAG_FNAME = re.compile(r'mag_grid_e(\d{8})-(\d{6})\.out$')
+
+
+def mag_time(fname):
+    """
+    Time of a mag_grid file, from its name (None if it does not follow the
+    mag_grid naming convention).
+    """
+
+    match = _MAG_FNAME.search(os.path.basename(fname))
+    if match is None:
+        return None
+    return dt.datetime.strptime(match.group(1) + match.group(2),
+                                '%Y%m%d%H%M%S')
+
+
+def mag_fname(dirname, t):
+    """
+    Name of the mag_grid file of a directory for a given time.
+    """
+
+    return os.path.join(dirname, t.strftime('mag_grid_e%Y%m%d-%H%M%S.out'))
+
+
+# Summary index kept in each mag_grid directory
+INDEX_NAME = '.mag_grid_index.npz'
+
+
+def _summarize(fname):
+    """
+    Maximum and minimum of dBn in a mag_grid file, and the grid points
+    (stations) where they are found.
+    """
+
+    dBn = mag_grid_read(fname)['dBn']
+    imax, imin = np.argmax(dBn), np.argmin(dBn)
+    return dBn[imax], dBn[imin], imax, imin
+
+
+def summary_index(dirname, executor=None, write=True):
+    """
+    This function returns the summary index of a mag_grid directory: per
+    file, its time, the maximum and minimum of dBn and the stations (grid
+    point numbers) where they are found. Enough to compute AU/AL/AE/AO
+    without reading the files again.
+
+    The index is stored next to the files (INDEX_NAME) and updated
+    incrementally: only files that are new, or whose size or modification
+    time changed, are read; removed files are dropped. A corrupt index is
+    rebuilt.
+
+    Input:
+    ------
+        dirname   Directory of mag_grid files
+        executor  Optional executor (e.g. ProcessPoolExecutor) to read new
+                  files on
+        write     Save the updated index; if the directory is not writable
+                  the index is only kept in memory
+
+    Output:
+    -------
+        dict    Columns 'fname', 'size', 'mtime_ns', 'time' (datetime64),
+                'max', 'min', 'argmax' and 'argmin', sorted by time.
+
+    """
+
+    path = os.path.join(dirname, INDEX_NAME)
+    old = {}
+    if os.path.exists(path):
+        try:
+            with np.load(path) as index:
+                old = {key: index[key] for key in index.files}
+        except (OSError, EOFError, ValueError, zipfile.BadZipFile):
+            old = {} # Corrupt or half-written index: rebuild it
+    known = {fname: i for i, fname in enumerate(old.get('fname', []))}
+
+    rows, new = [], []
+    for entry in os.scandir(dirname):
+        t = mag_time(entry.name)
+        if t is None:
+            continue
+        stat = entry.stat()
+        i = known.get(entry.name)
+        if (i is not None and old['size'][i] == stat.st_size and
+                old['mtime_ns'][i] == stat.st_mtime_ns):
+            rows.append((entry.name, stat.st_size, stat.st_mtime_ns, t,
+                         old['max'][i], old['min'][i], old['argmax'][i],
+                         old['argmin'][i]))
+        else:
+            new.append((entry.name, stat.st_size, stat.st_mtime_ns, t))
+
+    # Read the new and changed files
+    fnames = [os.path.join(dirname, row[0]) for row in new]
+    if executor is None:
+        summaries = map(_summarize, fnames)
+    else:
+        summaries = executor.map(_summarize, fnames,
+                                 chunksize=max(1, len(fnames) // 64))
+    for row, summary in zip(new, summaries):
+        rows.append(row + tuple(summary))
+
+    rows.sort(key=lambda row: row[3])
+    keys = ('fname', 'size', 'mtime_ns', 'time', 'max', 'min', 'argmax',
+            'argmin')
+    dtypes = (str, 'i8', 'i8', 'datetime64[s]', float, float, 'i8', 'i8')
+    index = {key: np.array([row[k] for row in rows], dtype=dtype)
+             for k, (key, dtype) in enumerate(zip(keys, dtypes))}
+
+    changed = len(new) > 0 or len(rows) != len(known)
+    if write and changed:
+        tmp = '{0}.tmp{1}.npz'.format(path[:-4], os.getpid())
+        try:
+            np.savez(tmp, **index)
+            os.replace(tmp, path)
+        except OSError:
+            # Read-only directory: use the index without saving it
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    return index
+
+
+# Compact stores of mag_grid runs
+STORE_EPOCH = np.datetime64('1970-01-01T00:00:00', 's')
+
+
+def _read_columns(args):
+    fname, columns = args
+    data = mag_grid_read(fname, columns)
+    return np.column_stack([data[col] for col in columns])
+
+
+def pack_run(dirname, fname, columns=None, chunk=60, max_workers=None,
+             debug=False):
+    """
+    This function packs the mag_grid files of a run directory into one
+    netCDF store, compressed (zlib) and chunked by time, so a time range
+    is read without decompressing the rest of the run.
+
+    Values are stored as 32-bit floats, which keeps the 7 significant digits
+    of the ASCII files. Files are read on a process pool, chunk files at a
+    time, so memory use does not grow with the length of the run. The store
+    is written aside and moved into place when complete.
+
+    Input:
+    ------
+        dirname     Directory of mag_grid files
+        fname       Store filename (e.g. run.nc)
+        columns     Components to keep (e.g. ('dBn', 'dBe', 'dBd')); None
+                    keeps all the columns but Lon and Lat
+        chunk       Number of times per chunk
+        max_workers Number of worker processes
+
+    Output:
+    -------
+        int     Number of times packed.
+
+    """
+
+    fnames = sorted((mag_time(name), os.path.join(dirname, name))
+                    for name in os.listdir(dirname)
+                    if mag_time(name) is not None)
+    if not fnames:
+        raise ValueError('No mag_grid files in {0}'.format(dirname))
+
+    first = mag_grid_read(fnames[0][1], columns=('Lon', 'Lat'))
+    header = first.attrs
+    if columns is None:
+        columns = [name for name in header['names'] 
+                   if name not in ('Lon', 'Lat')]
+    columns = list(columns)
+    nStation = len(first['Lon'])
+
+    tmp = '{0}.tmp{1}'.format(fname, os.getpid())
+    with ProcessPoolExecutor(max_workers=max_workers) as pool, \
+            ncdf.Dataset(tmp, 'w') as store:
+        store.title = header['title']
+        store.grid = header['grid']
+        store.components = ' '.join(columns)
+
+        store.createDimension('time', None)
+        store.createDimension('station', nStation)
+        store.createDimension('component', len(columns))
+
+        time = store.createVariable('time', 'i8', ('time',))
+        time.units = 'seconds since 1970-01-01 00:00:00'
+        for name in ('Lon', 'Lat'):
+            var = store.createVariable(name, 'f8', ('station',))
+            var[:] = first[name]
+        dB = store.createVariable('dB', 'f4', 
+                                  ('time', 'station', 'component'),
+                                  zlib=True, complevel=4, shuffle=True,
+                                  chunksizes=(min(chunk, len(fnames)),
+                                              nStation, len(columns)))
+        dB.units = 'nT'
+
+        for i in range(0, len(fnames), chunk):
+            batch = fnames[i:i+chunk]
+            values = list(pool.map(_read_columns, 
+                                   [(path, columns) for t, path in batch]))
+            times = np.array([t for t, path in batch], dtype='datetime64[s]')
+            time[i:i+len(batch)] = (times - STORE_EPOCH).astype('i8')
+            dB[i:i+len(batch)] = np.array(values, dtype='f4')
+            if debug: print(batch[-1][1])
+
+    os.replace(tmp, fname)
+    return len(fnames)
+
+
+class MagStore(object):
+    """
+    Reader for a mag_grid store written by pack_run. The time axis and
+    station coordinates are read on opening; dB is read by time range, one
+    chunk of times at a time from disk.
+
+        >>> with MagStore('run.nc') as store:
+        ...     data = store.read(dt.datetime(2010, 4, 5, 8, 0),
+        ...                       dt.datetime(2010, 4, 5, 9, 0), ('dBn',))
+
+    Attributes: time (datetime64 array), Lon and Lat (per station) and
+    components (names of the components).
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.data = ncdf.Dataset(fname)
+        self.data.set_auto_mask(False)
+
+        self.time = STORE_EPOCH + self.data.variables['time'][:].astype(
+            'timedelta64[s]')
+        self.Lon = self.data.variables['Lon'][:]
+        self.Lat = self.data.variables['Lat'][:]
+        self.components = self.data.components.split()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.time)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def _components(self, components):
+        if components is None:
+            components = self.components
+        for name in components:
+            if name not in self.components:
+                raise KeyError('{0} is not a component of {1}'
+                               .format(name, self.fname))
+        return [self.components.index(name) for name in components]
+
+    def read(self, t_start=None, t_end=None, components=None):
+        """
+        dB between two times (both included; None for the ends of the run).
+        Returns a MagData of 'time', 'Lon', 'Lat' and one (time, station)
+        array per component.
+        """
+
+        i0 = 0 if t_start is None else \
+            np.searchsorted(self.time, np.datetime64(t_start, 's'))
+        i1 = len(self.time) if t_end is None else \
+            np.searchsorted(self.time, np.datetime64(t_end, 's'), 'right')
+        cols = self._components(components)
+
+        dB = self.data.variables['dB'][i0:i1]
+
+        data = MagData()
+        data.attrs = {'file': self.fname, 'title': self.data.title}
+        data['time'] = self.time[i0:i1]
+        data['Lon'], data['Lat'] = self.Lon, self.Lat
+        for col in cols:
+            data[self.components[col]] = dB[:, :, col]
+        return data
+
+    def at(self, times, component='dBn', points=None):
+        """
+        One component at the given times (datetime64), as a (time, station)
+        array. Times not in the store are rows of NaN. With points (station
+        numbers), only those stations are read and returned.
+        """
+
+        col = self._components((component,))[0]
+        times = np.asarray(times, dtype='datetime64[s]')
+        n = len(self.Lon) if points is None else len(points)
+        values = np.full((len(times), n), np.nan)
+        if len(self.time) == 0:
+            return values
+
+        i = np.clip(np.searchsorted(self.time, times), 0, len(self.time) - 1)
+        found = self.time[i] == times
+        if found.any():
+            i0, i1 = i[found].min(), i[found].max() + 1
+            if points is None:
+                block = self.data.variables['dB'][i0:i1, :, col]
+            else:
+                # netCDF reads need increasing station numbers
+                stations, order = np.unique(points, return_inverse=True)
+                block = self.data.variables['dB'][i0:i1, stations, col]
+                block = block[:, order]
+            values[found] = block[i[found] - i0]
+        return values
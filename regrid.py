@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+regrid.py
+---------
+
+This module interpolates FAC maps between the AMPERE grid (ampere_read,
+nLat x nMLT+1) and the SWMF IE grid (swmf_read, theta x psi), so Jr can be
+compared point by point.
+
+Both readers return plottable coordinates in the same polar frame: 'Lat' is
+the distance from the pole in degrees and 'MLT' the polar angle in radians.
+The plottable AMPERE 'Lat' is one degree off the colatitude stored in the
+file, so AMPERE grids are placed at the file's colatitude (see ampere_colat),
+as in ifacs. Interpolation is bilinear in the (r, angle) frame and
+periodic in angle. For a pair of grids, the interpolation is built once as
+a sparse matrix (scipy.sparse) and cached; a whole time stack is then
+regridded with a single sparse matrix product. Points outside the source
+grid (e.g. closer to the pole than the first AMPERE latitude) are NaN.
+"""
+
+import numpy as np # Numerical Python
+import scipy.sparse as sparse # Sparse interpolation operators
+import hashlib # Geometry keys
+
+# Interpolation operators, per source and destination geometry
+_OPERATORS = {}
+
+
+def _grid2d(coord):
+    """
+    The 2D grid of a coordinate, also when given per frame (time stack).
+    """
+
+    coord = np.asarray(coord, dtype=float)
+    return coord[0] if coord.ndim == 3 else coord
+
+
+def _axes(r, angle):
+    """
+    1D axes of a tensor-product (r, angle) grid: the sorted distances from
+    the pole and the sorted distinct angles in [0, 2 pi), with the grid
+    index (along each axis) of each axis value. Repeated angles, such as
+    the ghost column of AMPERE, are used once.
+    """
+
+    if not (np.allclose(r, r[:, :1]) and np.allclose(angle, angle[:1, :])):
+        raise ValueError('Source is not a tensor-product (r, angle) grid')
+
+    r_order = np.argsort(r[:, 0], kind='stable')
+    r_axis = r[r_order, 0]
+
+    a = np.mod(angle[0], 2*np.pi)
+    a[np.isclose(a, 2*np.pi)] = 0.
+    a_axis, a_index = np.unique(np.round(a, 9), return_index=True)
+    a_axis = a[a_index]
+
+    return r_axis, r_order, a_axis, a_index
+
+
+def _key(*coords):
+    sha = hashlib.sha1()
+    for coord in coords:
+        sha.update(str(coord.shape).encode())
+        sha.update(np.ascontiguousarray(coord).tobytes())
+    return sha.hexdigest()
+
+
+def operator(src_r, src_angle, dst_r, dst_angle):
+    """
+    This function returns the bilinear interpolation operator from a source
+    (r, angle) grid to destination points, as a sparse matrix of shape
+    (destination points, source points) acting on flattened grids, and a
+    boolean array (destination shape) of the points within the source grid.
+    Operators are cached per pair of geometries.
+
+    Input:
+    ------
+        src_r       Source distance from the pole (deg), 2D grid
+        src_angle   Source angle (rad), 2D grid
+        dst_r       Destination distance from the pole (deg), any shape
+        dst_angle   Destination angle (rad), same shape as dst_r
+
+    Output:
+    -------
+        tuple   (csr_matrix, valid)
+
+    """
+
+    src_r, src_angle = _grid2d(src_r), _grid2d(src_angle)
+    dst_r, dst_angle = _grid2d(dst_r), _grid2d(dst_angle)
+    key = _key(src_r, src_angle, dst_r, dst_angle)
+    if key in _OPERATORS:
+        return _OPERATORS[key]
+
+    r_axis, r_order, a_axis, a_index = _axes(src_r, src_angle)
+    n_src = src_r.size
+    n_col = src_r.shape[1]
+
+    r = dst_r.ravel()
+    a = np.mod(dst_angle.ravel(), 2*np.pi)
+
+    # Distance from the pole: interval and weight; outside the grid is NaN
+    valid = (r >= r_axis[0]) & (r <= r_axis[-1])
+    i0 = np.clip(np.searchsorted(r_axis, r, 'right') - 1, 0,
+                 max(len(r_axis) - 2, 0))
+    i1 = np.minimum(i0 + 1, len(r_axis) - 1)
+    dr = r_axis[i1] - r_axis[i0]
+    wr = np.where(dr > 0, (r - r_axis[i0]) / np.where(dr > 0, dr, 1.), 0.)
+
+    # Angle: periodic interval (the last one wraps around) and weight
+    j0 = np.searchsorted(a_axis, a, 'right') - 1 # -1: before the first
+    j0 = np.mod(j0, len(a_axis))
+    j1 = np.mod(j0 + 1, len(a_axis))
+    da = np.mod(a_axis[j1] - a_axis[j0], 2*np.pi)
+    da[da == 0] = 2*np.pi # A single angle
+    wa = np.mod(a - a_axis[j0], 2*np.pi) / da
+
+    rows = np.arange(len(r))
+    ii = [r_order[i0], r_order[i0], r_order[i1], r_order[i1]]
+    jj = [a_index[j0], a_index[j1], a_index[j0], a_index[j1]]
+    ww = [(1-wr)*(1-wa), (1-wr)*wa, wr*(1-wa), wr*wa]
+
+    matrix = sparse.csr_matrix(
+        (np.concatenate(ww)[np.tile(valid, 4)],
+         (np.tile(rows, 4)[np.tile(valid, 4)],
+          np.concatenate([i*n_col + j for i, j in zip(ii, jj)])
+          [np.tile(valid, 4)])),
+        shape=(len(r), n_src))
+    matrix.eliminate_zeros() # Zero weights would spread NaNs
+
+    valid = valid.reshape(dst_r.shape)
+    valid.setflags(write=False)
+    _OPERATORS[key] = (matrix, valid)
+    return matrix, valid
+
+
+def regrid(values, src_r, src_angle, dst_r, dst_angle):
+    """
+    This function interpolates values on a source grid onto destination
+    points: one 2D frame, or a (time, ...) stack of frames at once.
+    Destination points outside the source grid are NaN.
+
+    Input:
+    ------
+        values      Source values, (n_r, n_angle) or (time, n_r, n_angle)
+        src_r       Source distance from the pole (deg)
+        src_angle   Source angle (rad)
+        dst_r       Destination distance from the pole (deg)
+        dst_angle   Destination angle (rad)
+
+    Output:
+    -------
+        ndarray Values on the destination grid, (time,) + destination shape
+                for a stack.
+
+    """
+
+    matrix, valid = operator(src_r, src_angle, dst_r, dst_angle)
+    values = np.asarray(values, dtype=float)
+    shape = values.shape[:-2] + valid.shape
+
+    flat = values.reshape((-1, matrix.shape[1]))
+    result = np.asarray(matrix @ flat.T).T.reshape(shape)
+    result[..., ~valid] = np.nan
+    return result
+
+
+def ampere_colat(ampere, hemi='north'):
+    """
+    Distance from the pole (deg) of the points of a plottable AMPERE grid
+    (ampere_read, or an AmpereFile frame or slice), from the colatitude
+    stored in the file (91 - Lat, see ifacs.ampere_weights): the plottable
+    'Lat' is 90 - Lat in the North and 90 + Lat in the South, so it is one
+    degree closer to the pole than the file's colatitude in the North and
+    one degree further in the South. SWMF 'Lat' is the true distance from
+    the pole (theta, and 180 - theta in the South).
+    """
+
+    if hemi == 'north':
+        return np.asarray(ampere['Lat'], dtype=float) + 1.
+    return np.asarray(ampere['Lat'], dtype=float) - 1.
+
+
+def swmf_to_ampere(swmf, ampere, hemi='north'):
+    """
+    SWMF Jr (swmf_read or swmf_read_dir) on the AMPERE grid of one
+    hemisphere (ampere_read, or an AmpereFile frame or slice).
+    """
+
+    h = hemi[0]
+    return regrid(swmf[h + '_Jr'], swmf[h + '_Lat'], swmf[h + '_MLT'],
+                  ampere_colat(ampere, hemi), ampere['MLT'])
+
+
+def ampere_to_swmf(ampere, swmf, hemi='north'):
+    """
+    AMPERE Jr (ampere_read, or an AmpereFile frame or slice) on the SWMF
+    grid of the same hemisphere.
+    """
+
+    h = hemi[0]
+    return regrid(ampere['Jr'], ampere_colat(ampere, hemi), ampere['MLT'],
+                  swmf[h + '_Lat'], swmf[h + '_MLT'])
@@ -18,19 +18,207 @@ Last Update on Thu Oct  1 00:25:36 2020
 
 import numpy as np # Numerical Python
 import matplotlib.pyplot as plt # Mathematical Plotting Library
-from spacepy.pybats import rim # To read in SWMF files
+import datetime as dt # Library to work with dates and times
+import re # Parsing the variable list and filenames
+import os # Listing directories
+import gzip # Compressed IE files
+from functools import partial # Worker arguments
+from concurrent.futures import ProcessPoolExecutor # Parallel file reads
+
+
+# Variables needed to plot and integrate FACs
+FAC_VARIABLES = ('theta', 'psi', 'jr')
+
+
+class IeData(dict):
+    """
+    Contents of an SWMF IE IDL file, laid out as spacepy.pybats.rim.Iono:
+    variables are keyed by hemisphere prefix and lower-case name ('n_jr',
+    's_theta', ...) as (ntheta, nphi) arrays, header values are kept in
+    attrs, and the grid spacing (in degrees) in dlat and dlon.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(IeData, self).__init__(*args, **kwargs)
+        self.attrs = {}
+
+
+# Error of a file cut short (e.g. still being written) or not an IE file
+_INVALID = 'Truncated or invalid SWMF IE file: {0}'
+
+
+def _section(lines, name):
+    """
+    Index of the first line after a section title of an IE file header.
+    """
+
+    return [line.strip() for line in lines].index(name) + 1
+
+
+def read_ie(fname, variables=None):
+    """
+    This function reads an SWMF IE IDL (ASCII) file straight into NumPy
+    arrays, without spacepy. The header is parsed once, the data blocks of
+    both hemispheres are parsed with a single vectorized call each, and only
+    the requested variables are kept. Values match spacepy's rim.Iono.
+    Gzip-compressed files (it*.idl.gz) are decompressed in memory while 
+    reading; no uncompressed copy is written to disk.
+    
+    Input:
+    ------
+        fname     SWMF IE filename (it*.idl or it*.idl.gz)
+        variables Lower-case variable names to keep, e.g. ('theta', 'psi', 
+                  'jr'), as listed in the file's VARIABLE LIST. Theta and 
+                  Psi are always kept. Default: all variables.
+    
+    Output:
+    -------
+        IeData  Dictionary of (ntheta, nphi) arrays keyed 'n_<var>' and 
+                's_<var>', with header values in attrs.
+            
+    """
+
+    if fname.endswith('.gz'):
+        f = gzip.open(fname, 'rt')
+    else:
+        f = open(fname, 'r')
+    with f:
+        raw = f.read()
+
+    # Split the header from the data blocks
+    north = raw.find('BEGIN NORTHERN HEMISPHERE')
+    south = raw.find('BEGIN SOUTHERN HEMISPHERE')
+    if north < 0 or south < north:
+        raise ValueError(_INVALID.format(fname))
+    lines = raw[:north].split('\n')
+
+    data = IeData()
+    data.attrs['file'] = fname
+
+    # Parse header
+    try:
+        title = lines[_section(lines, 'TITLE')]
+        data.attrs['title'] = title[title.index('"')+1:title.rindex('"')]
+
+        i = _section(lines, 'NUMERICAL VALUES')
+        data.attrs['nvars'] = int(lines[i].split()[0])
+        data.attrs['ntheta'] = int(lines[i+1].split()[0])
+        data.attrs['nphi'] = int(lines[i+2].split()[0])
+        nvars, ntheta, nphi = (data.attrs['nvars'], data.attrs['ntheta'], 
+                               data.attrs['nphi'])
+
+        i = _section(lines, 'TIME')
+        t = [int(line.split()[0]) for line in lines[i:i+7]]
+        data.attrs['time'] = dt.datetime(t[0], t[1], t[2], t[3], t[4], t[5], 
+                                         t[6]*1000)
+
+        i = _section(lines, 'SIMULATION')
+        data.attrs['iter'] = int(lines[i].split()[0])
+        data.attrs['simtime'] = float(lines[i+1].split()[0])
+
+        i = _section(lines, 'DIPOLE TILT')
+        data.tilt = np.array([float(lines[i].split()[0]), 
+                              float(lines[i+1].split()[0])])
+
+        i = _section(lines, 'VARIABLE LIST')
+    except (ValueError, IndexError):
+        raise ValueError(_INVALID.format(fname))
+    namevar = []
+    units = {}
+    for line in lines[i:i+nvars]:
+        match = re.match(r'\s*\d+\s+([\w\s\W]+)\[([\w\s\W]+)\]', line)
+        if match is None:
+            raise ValueError('Could not parse {0} in {1}'.format(line, fname))
+        name = match.group(1).strip().lower()
+        namevar.append(name)
+        units[name] = match.group(2).strip()
+    data.attrs['units'] = units
+
+    # Columns to keep
+    if variables is None:
+        keep = namevar
+    else:
+        keep = ['theta', 'psi'] + [var for var in variables 
+                                   if var not in ('theta', 'psi')]
+    for var in keep:
+        if var not in namevar:
+            raise KeyError('{0} is not a variable of {1}'.format(var, fname))
+    cols = [namevar.index(var) for var in keep]
+    data.attrs['variables'] = keep
+
+    # Read all data; whitespace-separated, so Fortran line wrapping of the
+    # records does not matter. Points run over theta first, then phi.
+    nPts = ntheta * nphi
+    for hemi, block in (('n_', raw[north:south]), ('s_', raw[south:])):
+        block = block[block.find('\n'):]
+        values = np.fromstring(block, sep=' ')
+        if values.size < nPts*nvars:
+            raise ValueError(_INVALID.format(fname))
+        values = values[:nPts*nvars].reshape(nphi, ntheta, nvars)
+        # Fortran-ordered like rim.Iono, so sums reproduce it bit for bit
+        for var, col in zip(keep, cols):
+            data[hemi+var] = np.asfortranarray(values[:, :, col].T)
+
+    # Some extra grid info:
+    data.dlon = data['n_psi'  ][0,3] - data['n_psi'  ][0,2]
+    data.dlat = data['n_theta'][3,0] - data['n_theta'][2,0]
+
+    return data
+
+
+def load_ie(source, variables=None, cache=None):
+    """
+    This function returns parsed SWMF IE data, parsing each file only once.
+    
+    Input:
+    ------
+        source    SWMF IE filename, or data already read with read_ie (or a
+                  spacepy rim.Iono object), which is returned as is
+        variables Variables to read (see read_ie)
+        cache     Optional dictionary of parsed files keyed by absolute path.
+                  Files found in it with the requested variables are not 
+                  parsed again; new parses are added to it. The caller owns
+                  the cache and decides how long it lives.
+    
+    Output:
+    -------
+        IeData  Parsed data; shared with the cache, do not modify it.
+            
+    """
+
+    if not isinstance(source, str):
+        return source
+    if cache is None:
+        return read_ie(source, variables)
+
+    key = os.path.abspath(source)
+    data = cache.get(key)
+    if data is not None:
+        have = data.attrs['variables']
+        if variables is None and len(have) == data.attrs['nvars']:
+            return data
+        if variables is not None and set(variables) <= set(have):
+            return data
+
+    data = read_ie(source, variables)
+    cache[key] = data
+    return data
+
 
 # For either hemisphere
-def swmf_read(fname, debug=False):
+def swmf_read(fname, debug=False, cache=None):
     """
     This function reads in an IDL file to help plot SWMF data on a polar plot 
     based on Latitude and magnetic local time (MLT) data.
     For further information, please refer to the SWMF Manual and/or 
-    spacepy.pybats.rim manual for data structures.
+    spacepy.pybats.rim manual for data structures; the file itself is read
+    with read_ie.
     
     Input:
     ------
-        fname     SWMF event filename for a given time
+        fname     SWMF event filename for a given time, or data already
+                  read with read_ie
+        cache     Optional parse cache (see load_ie)
     
     Output:
     -------
@@ -40,7 +228,7 @@ def swmf_read(fname, debug=False):
     """
     
     # Retrieve data from file !!!
-    data = rim.Iono(fname)
+    data = load_ie(fname, FAC_VARIABLES, cache)
     
     # Get size of array, and elements in dictionary
     if debug: 
@@ -68,6 +256,211 @@ def swmf_read(fname, debug=False):
 
     return swmf_data # Return plottable data to user...
 
+# SWMF IE filenames: it<yymmdd>_<HHMMSS>_<ms>.idl, optionally gzipped
+_IE_FNAME = re.compile(r'it(\d{6})_(\d{6})_(\d{3})\.idl(\.gz)?$')
+
+
+def ie_files(dirname, t_start=None, t_end=None):
+    """
+    This function lists the SWMF IE files of a directory, in time order.
+    Both plain (it*.idl) and gzipped (it*.idl.gz) files are listed; if a 
+    time has both, the plain file is used.
+    
+    Input:
+    ------
+        dirname   Directory with SWMF IE output
+        t_start   Optional first time (datetime) to include
+        t_end     Optional last time (datetime) to include
+    
+    Output:
+    -------
+        list    Filenames with t_start <= file time <= t_end.
+            
+    """
+
+    files = {}
+    for fname in sorted(os.listdir(dirname), reverse=True):
+        match = _IE_FNAME.search(fname)
+        if match is None:
+            continue
+        t = dt.datetime.strptime(match.group(1) + match.group(2) + 
+                                 match.group(3), '%y%m%d%H%M%S%f')
+        if t_start is not None and t < t_start: continue
+        if t_end is not None and t > t_end: continue
+        files[t] = os.path.join(dirname, fname) # .idl sorts after .idl.gz
+
+    return [files[t] for t in sorted(files)]
+
+
+def ie_fname(dirname, t):
+    """
+    Name of the SWMF IE file of a directory for a given time: the plain file
+    (it*.idl) unless only the gzipped one exists.
+    """
+
+    fname = os.path.join(dirname, t.strftime('it%y%m%d_%H%M%S_000.idl'))
+    if not os.path.exists(fname) and os.path.exists(fname + '.gz'):
+        return fname + '.gz'
+    return fname
+
+
+def output_times(t_start, t_end, cadence=dt.timedelta(minutes=1)):
+    """
+    Output times from t_start to t_end (both included) at the given
+    cadence, e.g. the frames of a comparison or the minutes of an index.
+    """
+
+    times = []
+    t = t_start
+    while t <= t_end:
+        times.append(t)
+        t += cadence
+    return times
+
+
+def _read_ie_or_error(fname, variables=None):
+    """
+    read_ie, returning the error of a file that cannot be read (truncated,
+    invalid, or gone) instead of raising it, so one bad file does not stop
+    a pool.map.
+    """
+
+    try:
+        return read_ie(fname, variables)
+    except (OSError, EOFError, ValueError) as err:
+        return err
+
+
+def read_ie_stack(fnames, variables=FAC_VARIABLES, max_workers=None,
+                  skip_invalid=False):
+    """
+    This function reads many SWMF IE files on a process pool and stacks 
+    them in time. All files must share one grid. Gzipped files are 
+    decompressed by the workers, i.e. in parallel.
+    
+    Input:
+    ------
+        fnames       SWMF IE filenames, in time order
+        variables    Variables to read (see read_ie)
+        max_workers  Number of worker processes (default: one per CPU); 
+                     1 reads the files in this process
+        skip_invalid Leave out files that cannot be read (e.g. still being
+                     written) instead of raising ValueError
+    
+    Output:
+    -------
+        IeData  Dictionary with 'time' (datetime64 array), the grid as 
+                single (ntheta, nphi) arrays shared by all frames ('n_theta',
+                'n_psi', 's_theta', 's_psi') and every other variable as a 
+                (time, ntheta, nphi) array ('n_jr', 's_jr', ...). The files
+                stacked are listed in attrs['files'], those left out in
+                attrs['skipped']. None if skip_invalid and no file could be
+                read.
+            
+    """
+
+    if len(fnames) == 0:
+        raise ValueError('No SWMF IE files to read')
+
+    read = partial(_read_ie_or_error if skip_invalid else read_ie,
+                   variables=variables)
+    if max_workers == 1:
+        frames = map(read, fnames)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=max_workers)
+        chunk = max(1, len(fnames) // (4 * (max_workers or os.cpu_count())))
+        frames = pool.map(read, fnames, chunksize=chunk)
+
+    try:
+        stack = IeData()
+        time, files, skipped = [], [], []
+        for fname, frame in zip(fnames, frames):
+            if isinstance(frame, Exception):
+                skipped.append(fname)
+                continue
+
+            t_ind = len(time)
+            if t_ind == 0:
+                # Grid: kept once for all frames
+                ntheta, nphi = frame.attrs['ntheta'], frame.attrs['nphi']
+                for key in ('n_theta', 'n_psi', 's_theta', 's_psi'):
+                    stack[key] = frame[key]
+                stack.attrs = {key: frame.attrs[key] for key in frame.attrs
+                               if key not in ('file', 'time')}
+                stack.dlon, stack.dlat = frame.dlon, frame.dlat
+                for key in frame:
+                    if key not in stack:
+                        stack[key] = np.empty((len(fnames), ntheta, nphi))
+            elif (frame.attrs['ntheta'], frame.attrs['nphi']) != (ntheta, nphi):
+                raise ValueError('Grid of {0} differs from {1}'
+                                 .format(fname, files[0]))
+
+            time.append(frame.attrs['time'])
+            files.append(fname)
+            for key in frame:
+                if stack[key].ndim == 3:
+                    stack[key][t_ind] = frame[key]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if not time:
+        return None
+    for key in stack:
+        if stack[key].ndim == 3 and len(time) < len(fnames):
+            stack[key] = stack[key][:len(time)]
+
+    stack['time'] = np.array(time, dtype='datetime64[ms]')
+    stack.attrs['files'] = files
+    stack.attrs['skipped'] = skipped
+
+    return stack
+
+
+def swmf_read_dir(dirname, t_start=None, t_end=None, max_workers=None):
+    """
+    This function reads all SWMF IE files of a directory within a time range
+    into time-stacked, plottable arrays: the batch version of swmf_read. 
+    The MLT and Latitude transforms are applied once, to the shared grid.
+    
+    Input:
+    ------
+        dirname     Directory with SWMF IE output
+        t_start     Optional first time (datetime) to include
+        t_end       Optional last time (datetime) to include
+        max_workers Number of worker processes (see read_ie_stack)
+    
+    Output:
+    -------
+        dict    Dictionary with 'time', (ntheta, nphi) arrays 'n_MLT', 
+                'n_Lat', 's_MLT', 's_Lat' and (time, ntheta, nphi) arrays 
+                'n_Jr' and 's_Jr'.
+            
+    """
+
+    data = read_ie_stack(ie_files(dirname, t_start, t_end), FAC_VARIABLES, 
+                         max_workers=max_workers)
+    return stack_plottable(data)
+
+
+def stack_plottable(data):
+    """
+    Plottable MLT, Latitude and Jr (see swmf_read_dir) of a time stack read 
+    with read_ie_stack.
+    """
+
+    swmf_data = {}
+    swmf_data['time'] = data['time']
+    swmf_data['n_MLT'] = data['n_psi']*np.pi/180.0+np.pi/2.
+    swmf_data['n_Lat'] = data['n_theta']
+    swmf_data['n_Jr'] = data['n_jr']
+    swmf_data['s_MLT'] = data['s_psi']*np.pi/180.0+np.pi/2.
+    swmf_data['s_Lat'] = 180. - data['s_theta']
+    swmf_data['s_Jr'] = data['s_jr']
+
+    return swmf_data
+
 #=============================================================================
 
 # MAIN FUNCTION: